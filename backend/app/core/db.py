@@ -1,10 +1,49 @@
+from sqlalchemy import event, inspect
 from sqlmodel import SQLModel, create_engine, Session
 
 DATABASE_URL = "sqlite:///./app.db"  # local dev
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# the API and the job workers share this file; wait on locks instead of erroring
+engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False, "timeout": 30})
+
+@event.listens_for(engine, "connect")
+def _sqlite_pragmas(dbapi_conn, _):
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")   # readers don't block the writer
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.close()
 
 def init_db():
     SQLModel.metadata.create_all(engine)
+    _add_missing_columns()
+
+def _sql_literal(value) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+def _add_missing_columns():
+    """
+    create_all() creates new tables but never alters existing ones. Add columns and indexes
+    that models gained after their table was created (idempotent; runs at every startup).
+    Existing rows get the column's scalar default, or NULL.
+    """
+    insp = inspect(engine)
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            if not insp.has_table(table.name):
+                continue
+            have = {c["name"] for c in insp.get_columns(table.name)}
+            for col in table.columns:
+                if col.name in have:
+                    continue
+                ddl = f'ALTER TABLE "{table.name}" ADD COLUMN "{col.name}" {col.type.compile(engine.dialect)}'
+                if col.default is not None and col.default.is_scalar:
+                    ddl += f" DEFAULT {_sql_literal(col.default.arg)}"
+                conn.exec_driver_sql(ddl)
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
 
 def get_session():
     with Session(engine) as s:
@@ -1,10 +1,37 @@
-from fastapi import FastAPI
+import os
+import threading
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from app.core.db import init_db
+from fastapi.responses import JSONResponse
+from sqlmodel import Session
+from app.core.db import init_db, engine
 from app.routers import audio
+from app.services import vad as vad_service
+from app.services import admission
+from app.services import jobs
+from app.services import llm
+from app.services import llm_cache
+from app.services import inference
+
+# run a pipeline worker inside the API process (dev / single box); set to 0 when
+# workers run separately via `python -m app.worker`
+JOBS_INPROCESS = os.getenv("JOBS_INPROCESS", "1") == "1"
 
 app = FastAPI(title="Vocal Journal API", version="0.1.0")
 
+@app.middleware("http")
+async def admit_uploads(request: Request, call_next):
+    # refuse uploads while the model queue is full before the route's form parsing reads and
+    # spools the body; the route checks again once the upload's duration is known.
+    # Registered before CORS so the 429 still carries CORS headers.
+    if request.method == "POST" and request.url.path == "/api/upload":
+        with Session(engine) as s:
+            retry_after = admission.check(s)
+        if retry_after is not None:
+            return JSONResponse({"detail": "Processing queue is full; try again later."}, status_code=429,
+                                headers={"Retry-After": str(retry_after)})
+    return await call_next(request)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000", "http://127.0.0.1:3000", "*"],  # dev only; tighten later
@@ -17,4 +44,31 @@ app.include_router(audio.router)
 
 @app.on_event("startup")
 def on_startup():
-    init_db()
\ No newline at end of file
+    init_db()
+    if JOBS_INPROCESS and vad_service.WARMUP and not inference.PROCESSES:
+        # load in the background so the API comes up right away; /health reports readiness
+        threading.Thread(target=vad_service.warmup, name="vad-warmup", daemon=True).start()
+    if JOBS_INPROCESS:
+        from app.worker import Worker
+        Worker().start()
+
+@app.get("/health")
+def health():
+    return {
+        "ok": True,
+        **_model_stats(),
+        "llm_cache": llm_cache.stats(),
+        "llm_usage": llm.usage_stats(),
+        **_queue_stats(),
+    }
+
+def _model_stats():
+    # models live wherever the worker runs inference; a separate `app.worker` reports in its own log
+    if not JOBS_INPROCESS:
+        return {}
+    stats = inference.stats()
+    return {"models": {"emotion": stats["ready"]}, "inference": stats}
+
+def _queue_stats():
+    with Session(engine) as s:
+        return {"jobs": jobs.stats(s), "queue": admission.load(s), "user_wait": jobs.wait_stats(s)}
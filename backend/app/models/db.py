@@ -8,6 +8,9 @@ class Audio(SQLModel, table=True):
     session_id: Optional[str] = None
     filename: str
     storage_path: str
+    content_hash: Optional[str] = Field(default=None, index=True)  # sha256 of the upload (dedup)
+    duration_s: Optional[float] = None  # estimated at upload (admission control)
+    priority: int = 0                    # 0 = interactive, 1 = bulk ingest (see jobs.PRIORITIES)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     status: str = "processing"         # processing | ready | failed
     vad_ready: bool = False
@@ -22,11 +25,27 @@ class VAD(SQLModel, table=True):
     storage_path: str          # data/vad/{audio_id}.json
     duration: Optional[float] = None
 
+class Embedding(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    audio_id: int = Field(index=True)
+    user_id: Optional[str] = Field(default=None, index=True)
+    row: int                   # row in data/embeddings/vectors.f32
+
+class LanguageProfile(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: str = Field(index=True, unique=True)
+    language: Optional[str] = None       # majority detected language
+    matches: int = 0                     # net support for `language` (agreements minus disagreements)
+    detections: int = 0                  # confident detections in total
+    hinted: int = 0                      # transcriptions run with the hint since the last detection
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
 class Transcript(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     audio_id: int
     storage_path: str          # data/transcripts/{audio_id}.json
     summary: Optional[str] = None
+    version: int = 2           # 1 = fast draft, 2 = full quality (see transcribe.TIERS)
 
 class Summary(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -43,3 +62,30 @@ class Music(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     audio_id: int
     file_path: str   # data/music/{audio_id}.mp3
+
+class Artifact(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    content_hash: str = Field(index=True)  # sha256 of the uploaded bytes
+    kind: str                              # "vad" | "transcript"
+    config_key: str                        # model/config version that produced it (see *.config_key())
+    audio_id: int                          # entry that produced it
+    storage_path: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class Job(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    audio_id: int = Field(index=True)
+    stage: str                          # see pipeline.STAGES
+    status: str = Field(default="queued", index=True)   # queued | running | done | failed
+    user_id: Optional[str] = Field(default=None, index=True)   # copied from Audio (fair share)
+    priority: int = 0                   # copied from Audio.priority
+    refresh: bool = False               # LLM stages: bypass the reply cache (?refresh=1)
+    attempts: int = 0
+    run_after: datetime = Field(default_factory=datetime.utcnow)   # retry backoff
+    lease_until: Optional[datetime] = None   # a running job whose lease expired is picked up again
+    heartbeat_at: Optional[datetime] = None
+    started_at: Optional[datetime] = Field(default=None, index=True)   # last claim; wait = started_at - run_after
+    worker_id: Optional[str] = None
+    last_error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
@@ -1,50 +1,66 @@
 # backend/app/routers/audio.py
-from fastapi import APIRouter, UploadFile, File, Form, BackgroundTasks, Depends, HTTPException
+from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, Request
 from fastapi.responses import StreamingResponse, FileResponse
 from sqlmodel import select, Session
 from typing import Optional
-import aiofiles, time, json
+import aiofiles, asyncio, hashlib, os, time, json
 
-from app.models.db import Audio, VAD, Transcript, Summary, Response, Music
+from app.models.db import Audio, VAD, Transcript, Summary, Response, Music, Embedding
 from app.core.db import get_session, engine
 from app.services import storage
-from app.services import vad as vad_service
-from app.services import transcribe as tx_service
-from app.services import summary as sm_service
-from app.services import response as rp_service
+from app.services import admission
+from app.services import jobs
+from app.services import pipeline
+from app.services import embeddings as emb_service
 
 router = APIRouter(prefix="/api", tags=["audio"])
 
+STREAM_POLL_S = 0.5   # how often /transcript/stream checks for new segments
+
 # --------------------------
 # Upload
 # --------------------------
 @router.post("/upload")
 async def upload_audio(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     user_id: Optional[str] = Form(None),
     session_id: Optional[str] = Form(None),
+    priority: str = Form("interactive"),   # "bulk" for archive imports / scripted ingest
     session=Depends(get_session),
 ):
-    # 1) Save to tmp
+    if priority not in jobs.PRIORITIES:
+        raise HTTPException(400, f"priority must be one of {sorted(jobs.PRIORITIES)}")
+
+    # 1) Save to tmp (a full queue was already refused before the body was read: main.admit_uploads)
     tmp_path = storage.TMP_DIR / f"{int(time.time()*1000)}_{file.filename}"
+    digest = hashlib.sha256()   # hashed while streaming, for the dedup cache
     async with aiofiles.open(tmp_path, "wb") as out:
         while chunk := await file.read(1024 * 1024):
+            digest.update(chunk)
             await out.write(chunk)
+    content_hash = digest.hexdigest()
+    # admission again, now with this upload's duration counted against the audio-seconds limit
+    duration_s = await asyncio.to_thread(admission.estimate_seconds, str(tmp_path))
+    try:
+        _admit_or_429(session, duration_s)
+    except HTTPException:
+        tmp_path.unlink(missing_ok=True)
+        raise
 
     # 2) Create DB row (processing)
-    audio = Audio(filename=file.filename, storage_path="", user_id=user_id, session_id=session_id)
+    audio = Audio(filename=file.filename, storage_path="", user_id=user_id, session_id=session_id,
+                  content_hash=content_hash, duration_s=duration_s, priority=jobs.PRIORITIES[priority])
     session.add(audio); session.commit(); session.refresh(audio)
 
-    # 3) Move to final location and update
-    final_name = f"{audio.id}_{file.filename}"
-    final_path = storage.move_to_audio(str(tmp_path), final_name)
+    # 3) Move to final (content-addressed) location and update; a re-upload reuses the stored file
+    final_path = storage.move_to_audio_by_hash(str(tmp_path), content_hash, file.filename)
     audio.storage_path = final_path
     session.add(audio); session.commit()
 
-    # 4) Start background jobs (VAD + Transcription ONLY)
-    background_tasks.add_task(run_vad, audio.id)
-    background_tasks.add_task(run_transcription, audio.id)
+    # 4) Queue the pipeline: stages without inputs (VAD + Transcription) start now, the rest
+    #    are queued as their inputs finish (see pipeline.DEPENDS)
+    pipeline.schedule(session, audio.id)
+    session.commit()
 
     return {
         "id": audio.id,
@@ -55,9 +71,16 @@ async def upload_audio(
         "response_ready": audio.response_ready,
     }
 
+def _admit_or_429(session, audio_s: float = 0.0) -> None:
+    retry_after = admission.check(session, audio_s)
+    if retry_after is not None:
+        raise HTTPException(429, "Processing queue is full; try again later.",
+                            headers={"Retry-After": str(retry_after)})
+
 # --------------------------
 # Background jobs
 # --------------------------
+# Stage functions live in app/services/pipeline.py and run on the job worker (app/worker.py).
 # def run_vad(audio_id: int):
 #     with Session(engine) as s:
 #         a = s.get(Audio, audio_id)
@@ -76,129 +99,37 @@ async def upload_audio(
 #             s.add(a); s.commit()
 #         except Exception:
 #             a.status = "failed"; s.add(a); s.commit()
-# at top with other imports
-from app.services import audio_utils
-
-def run_vad(audio_id: int):
-    with Session(engine) as s:
-        a = s.get(Audio, audio_id)
-        if not a:
-            return
-        try:
-            src_path = a.storage_path
-
-            # If the uploaded file is mp3, convert to wav for VAD
-            if src_path.lower().endswith(".mp3"):
-                if not audio_utils.ffmpeg_ok():
-                    raise RuntimeError("ffmpeg is required to convert mp3 → wav for VAD.")
-                # write the converted wav into tmp; no need to keep permanently
-                wav_tmp = storage.TMP_DIR / f"{a.id}_vad.wav"
-                src_path = audio_utils.convert_mp3_to_wav(a.storage_path, str(wav_tmp), sample_rate=16000)
-
-            result = vad_service.compute_vad_from_wav(src_path)
-            path = storage.vad_json_path(a.id)
-            vad_service.save_vad_json(result, path)
-
-            row = VAD(audio_id=a.id, storage_path=path)
-            s.add(row)
-            a.vad_ready = True
-            if a.transcript_ready and a.summary_ready and a.response_ready:
-                a.status = "ready"
-            s.add(a); s.commit()
-
-        except Exception:
-            a.status = "failed"; s.add(a); s.commit()
-
-
-def run_transcription(audio_id: int):
-    with Session(engine) as s:
-        a = s.get(Audio, audio_id)
-        if not a:
-            return
-        try:
-            tx = tx_service.transcribe(a.storage_path)  # ONLY transcript now
-            path = storage.transcript_json_path(a.id)
-            tx_service.save_transcript_json(tx, path)
-            row = Transcript(audio_id=a.id, storage_path=path, summary=None)  # keep column for back-compat
-            s.add(row)
-            a.transcript_ready = True
-            if a.vad_ready and a.summary_ready and a.response_ready:
-                a.status = "ready"
-            s.add(a); s.commit()
-
-            run_summary(audio_id)
-        except Exception:
-            a.status = "failed"; s.add(a); s.commit()
-
-def run_summary(audio_id: int):
-    with Session(engine) as s:
-        a = s.get(Audio, audio_id)
-        if not a:
-            return
-        tx = s.exec(select(Transcript).where(Transcript.audio_id == audio_id)).first()
-        if not tx:
-            return
-        try:
-            obj = sm_service.summarize_from_transcript(tx.storage_path)
-            path = storage.summary_json_path(a.id)
-            sm_service.save_summary_json(obj, path)
-            row = Summary(audio_id=a.id, storage_path=path, source=obj.get("summary_source"))
-            s.add(row)
-            a.summary_ready = True
-            if a.vad_ready and a.transcript_ready and a.response_ready:
-                a.status = "ready"
-            s.add(a); s.commit()
-
-            run_response(audio_id)
-        except Exception:
-            a.status = "failed"; s.add(a); s.commit()
-
-def run_response(audio_id: int):
-    with Session(engine) as s:
-        a = s.get(Audio, audio_id)
-        if not a:
-            return
-        tx = s.exec(select(Transcript).where(Transcript.audio_id == audio_id)).first()
-        sm = s.exec(select(Summary).where(Summary.audio_id == audio_id)).first()
-        vd = s.exec(select(VAD).where(VAD.audio_id == audio_id)).first()
-        if not tx or not sm:
-            return
-        try:
-            emotion_path = vd.storage_path if vd else None
-            obj = rp_service.generate_response(
-                transcript_path=tx.storage_path,
-                summary_path=sm.storage_path,
-                emotion_path=emotion_path,
-            )
-            path = storage.response_json_path(a.id)
-            rp_service.save_response_json(obj, path)
-            row = Response(audio_id=a.id, storage_path=path)
-            s.add(row)
-            a.response_ready = True
-            if a.vad_ready and a.transcript_ready and a.summary_ready:
-                a.status = "ready"
-            s.add(a); s.commit()
-        except Exception:
-            a.status = "failed"; s.add(a); s.commit()
 
 # --------------------------
 # Triggers
 # --------------------------
 @router.post("/audio/{audio_id}/summarize")
-def start_summary(audio_id: int, background_tasks: BackgroundTasks, session=Depends(get_session)):
+def start_summary(audio_id: int, refresh: bool = False, session=Depends(get_session)):
+    """Re-run the summary; ?refresh=1 asks the LLM again instead of serving a cached reply."""
     a = session.get(Audio, audio_id)
     if not a:
         raise HTTPException(404, "Audio not found")
-    background_tasks.add_task(run_summary, audio_id)
+    _inputs_or_409(session, audio_id, "summary")
+    # the response is rebuilt from the new summary once it lands (pipeline.RERUN)
+    jobs.enqueue(session, audio_id, "summary", refresh=refresh); session.commit()
     return {"ok": True}
 
 @router.post("/audio/{audio_id}/respond")
-def start_response(audio_id: int, background_tasks: BackgroundTasks, session=Depends(get_session)):
+def start_response(audio_id: int, refresh: bool = False, session=Depends(get_session)):
+    """Re-run the response; ?refresh=1 asks the LLM again instead of serving a cached reply."""
     a = session.get(Audio, audio_id)
     if not a:
         raise HTTPException(404, "Audio not found")
-    background_tasks.add_task(run_response, audio_id)
+    _inputs_or_409(session, audio_id, "response")
+    jobs.enqueue(session, audio_id, "response", refresh=refresh); session.commit()
     return {"ok": True}
+
+def _inputs_or_409(session, audio_id: int, stage: str) -> None:
+    # a stage run before its inputs exist would do nothing (or answer without emotion cues);
+    # the pipeline queues it by itself once they are ready
+    missing = pipeline.missing_inputs(session, audio_id, stage)
+    if missing:
+        raise HTTPException(409, f"{stage} needs {', '.join(missing)} first; it runs automatically when ready.")
 # --------------------------
 # Getters
 # --------------------------
@@ -232,6 +163,112 @@ def get_transcript(audio_id: int, session=Depends(get_session)):
     with open(t.storage_path) as f:
         return json.load(f)
 
+def _sse(event: str, data, event_id: Optional[int] = None) -> str:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _segments_from_final(path: str):
+    # entries transcribed before the stream log existed: regroup flat words under their segment
+    with open(path) as f:
+        tx = json.load(f)
+    words = tx.get("words") or []
+    for seg in tx.get("segments") or []:
+        start, end = seg.get("start") or 0, seg.get("end") or 0
+        yield {**seg, "words": [w for w in words if start <= (w.get("start") or 0) < end]}
+
+def _poll_stream(audio_id: int, stream_path: str, offset: int, inode: Optional[int]):
+    """
+    One /transcript/stream poll (blocking; run in a thread) -> (entry status or None if missing,
+    final transcript path once ready else None, (inode, new text, new offset) of the segment log
+    or None if there is no log). A log with a different inode is read from the start.
+    """
+    with Session(engine) as s:
+        a = s.get(Audio, audio_id)
+        t = s.exec(select(Transcript).where(Transcript.audio_id == audio_id)).first()
+    final_path = t.storage_path if a and a.transcript_ready and t else None
+    try:
+        with open(stream_path) as f:
+            ino = os.fstat(f.fileno()).st_ino
+            f.seek(offset if ino == inode else 0)
+            chunk = f.read()
+            log = (ino, chunk, f.tell())
+    except FileNotFoundError:
+        log = None
+    return (a.status if a else None), final_path, log
+
+@router.get("/audio/{audio_id}/transcript/stream")
+async def stream_transcript(
+    audio_id: int,
+    request: Request,
+    after: Optional[int] = None,
+    session=Depends(get_session),
+):
+    """
+    Server-Sent Events: one `segment` event per Whisper segment (with its words) as soon as
+    it is decoded, then `done`. Event ids are segment indexes; reconnecting clients resume via
+    the Last-Event-ID header (or ?after=<index>).
+    """
+    if not session.get(Audio, audio_id):
+        raise HTTPException(404, "Not found")
+    last = request.headers.get("last-event-id")
+    start = (int(last) + 1) if last and last.isdigit() else ((after + 1) if after is not None else 0)
+    stream_path = storage.transcript_stream_path(audio_id)
+
+    async def events():
+        nonlocal start
+        idx, offset, buf, idle, inode = 0, 0, "", 0.0, None
+        while True:
+            if await request.is_disconnected():
+                return
+            # DB and file reads run in a thread so idle streams never block the event loop
+            status, final_path, log = await asyncio.to_thread(_poll_stream, audio_id, stream_path, offset, inode)
+            ready = final_path is not None
+
+            if ready and log is None:
+                recs = await asyncio.to_thread(lambda: list(_segments_from_final(final_path)))
+                for rec in recs:
+                    if idx >= start:
+                        yield _sse("segment", rec, idx)
+                    idx += 1
+                yield _sse("done", {"segments": idx})
+                return
+
+            if log is not None:
+                ino, chunk, offset = log
+                if inode is not None and ino != inode:
+                    # a retried transcription started a new log: re-read it, but only
+                    # send segments past what this client already has
+                    start, idx, buf = max(start, idx), 0, ""
+                inode = ino
+                buf += chunk
+                *lines, buf = buf.split("\n")   # keep a partially written line for next round
+                for line in lines:
+                    if line:
+                        if idx >= start:
+                            yield _sse("segment", json.loads(line), idx)
+                        idx += 1
+                if lines:
+                    idle = 0.0
+
+            if ready and not buf:
+                yield _sse("done", {"segments": idx})
+                return
+            if status is None or status == "failed":
+                yield _sse("error", {"status": status or "missing"})
+                return
+
+            await asyncio.sleep(STREAM_POLL_S)
+            idle += STREAM_POLL_S
+            if idle >= 15:
+                yield ": keep-alive\n\n"
+                idle = 0.0
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.get("/audio/{audio_id}/summary")
 def get_summary(audio_id: int, session=Depends(get_session)):
     sm = session.exec(select(Summary).where(Summary.audio_id == audio_id)).first()
@@ -248,6 +285,31 @@ def get_response(audio_id: int, session=Depends(get_session)):
     with open(rp.storage_path) as f:
         return json.load(f)
 
+@router.get("/audio/{audio_id}/similar")
+def get_similar(audio_id: int, k: int = 5, session=Depends(get_session)):
+    a = session.get(Audio, audio_id)
+    if not a:
+        raise HTTPException(404, "Audio not found")
+    e = session.exec(select(Embedding).where(Embedding.audio_id == audio_id)).first()
+    if not e:
+        raise HTTPException(404, "Embedding not ready")
+    # same owner only; entries without a user are only compared with each other
+    q = select(Embedding.audio_id, Embedding.row).where(Embedding.audio_id != audio_id)
+    q = q.where(Embedding.user_id.is_(None) if a.user_id is None else Embedding.user_id == a.user_id)
+    cands = session.exec(q).all()
+    hits = [(cands[i][0], score)
+            for i, score in emb_service.top_k(e.row, [row for _, row in cands], k=max(1, min(k, 100)))]
+    rows = {x.id: x for x in session.exec(select(Audio).where(Audio.id.in_([aid for aid, _ in hits]))).all()}
+    return [
+        {
+            "id": aid,
+            "score": score,
+            "filename": rows[aid].filename if aid in rows else None,
+            "created_at": rows[aid].created_at.isoformat() if aid in rows else None,
+        }
+        for aid, score in hits
+    ]
+
 @router.get("/audio")
 def list_audio(
     user_id: Optional[str] = None,
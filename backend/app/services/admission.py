@@ -0,0 +1,58 @@
+# backend/app/services/admission.py
+# Admission control for uploads. Work in flight is measured from the job table: entries with
+# model stages still queued or running, and the audio seconds they carry. Over either limit
+# the API answers 429 with a Retry-After estimated from how long the backlog takes to drain.
+
+import os
+from typing import Any, Dict, Optional
+
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from app.models.db import Audio, Job
+from app.services import audio_utils
+from app.services import pipeline
+
+MAX_ENTRIES   = int(os.getenv("ADMIT_MAX_ENTRIES", "50"))        # entries waiting on models; 0 = no limit
+MAX_AUDIO_S   = float(os.getenv("ADMIT_MAX_AUDIO_S", "7200"))    # audio seconds waiting on models; 0 = no limit
+REALTIME      = float(os.getenv("ADMIT_RTF", "0.5"))             # processing s per audio s (VAD + STT), per slot
+SLOTS         = int(os.getenv("WORKER_CPU_SLOTS", "2"))          # model stages in flight across workers
+RETRY_MIN_S   = int(os.getenv("ADMIT_RETRY_MIN_S", "5"))
+RETRY_MAX_S   = int(os.getenv("ADMIT_RETRY_MAX_S", "600"))
+BYTES_PER_S   = 16000   # ~128 kbps, used when ffprobe can't tell the duration
+
+
+def estimate_seconds(path: str) -> float:
+    d = audio_utils.probe_duration(path)
+    if d is None:
+        d = os.path.getsize(path) / BYTES_PER_S
+    return d
+
+def load(s: Session) -> Dict[str, Any]:
+    """Entries with model stages queued or running, and their audio seconds."""
+    pending = (
+        select(Job.audio_id)
+        .where(Job.status.in_(("queued", "running")), Job.stage.in_(tuple(pipeline.CPU_STAGES)))
+        .distinct()
+    )
+    entries, audio_s = s.exec(
+        select(func.count(Audio.id), func.coalesce(func.sum(Audio.duration_s), 0.0))
+        .where(Audio.id.in_(pending))
+    ).one()
+    return {"entries": entries, "audio_s": round(float(audio_s), 1),
+            "max_entries": MAX_ENTRIES, "max_audio_s": MAX_AUDIO_S}
+
+def _retry_after(audio_s: float) -> int:
+    drain = audio_s * REALTIME / max(1, SLOTS)
+    return int(min(RETRY_MAX_S, max(RETRY_MIN_S, drain)))
+
+def check(s: Session, audio_s: float = 0.0) -> Optional[int]:
+    """None to admit, else the Retry-After seconds. An idle queue always admits (even one huge file)."""
+    cur = load(s)
+    if cur["entries"] == 0:
+        return None
+    if MAX_ENTRIES and cur["entries"] >= MAX_ENTRIES:
+        return _retry_after(cur["audio_s"])
+    if MAX_AUDIO_S and cur["audio_s"] + audio_s > MAX_AUDIO_S:
+        return _retry_after(cur["audio_s"] + audio_s - MAX_AUDIO_S)
+    return None
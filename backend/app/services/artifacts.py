@@ -0,0 +1,37 @@
+# backend/app/services/artifacts.py
+# Dedup cache for pipeline outputs. Uploads are hashed (sha256) while they stream in; a VAD or
+# transcript JSON computed for one entry is recorded under (content_hash, kind, config_key) so a
+# re-upload of the same bytes with the same model settings links to it instead of re-running models.
+
+import os
+from typing import Optional
+
+from sqlmodel import Session, select
+
+from app.models.db import Artifact
+
+ENABLED = os.getenv("DEDUP_ENABLED", "1") == "1"
+
+def lookup(s: Session, content_hash: Optional[str], kind: str, config_key: str) -> Optional[Artifact]:
+    """Existing artifact for these bytes + settings, or None. Stale rows (file gone) are dropped."""
+    if not ENABLED or not content_hash:
+        return None
+    art = s.exec(
+        select(Artifact)
+        .where(Artifact.content_hash == content_hash, Artifact.kind == kind, Artifact.config_key == config_key)
+        .order_by(Artifact.id.desc())
+    ).first()
+    if art and not os.path.exists(art.storage_path):
+        s.delete(art); s.commit()
+        return None
+    return art
+
+def remember(s: Session, content_hash: Optional[str], kind: str, config_key: str,
+             audio_id: int, storage_path: str) -> None:
+    """Record an artifact for later re-uploads (caller commits)."""
+    if not ENABLED or not content_hash:
+        return
+    if lookup(s, content_hash, kind, config_key):
+        return
+    s.add(Artifact(content_hash=content_hash, kind=kind, config_key=config_key,
+                   audio_id=audio_id, storage_path=storage_path))
@@ -1,32 +1,93 @@
 # backend/app/services/audio_utils.py
+import fcntl
+import os
 import subprocess
+import threading
+import uuid
 from pathlib import Path
 
+import numpy as np
+
+from app.services import storage
+
+SAMPLE_RATE = 16000
+
 def ffmpeg_ok() -> bool:
     try:
         return subprocess.run(["ffmpeg", "-version"], capture_output=True, text=True).returncode == 0
     except Exception:
         return False
 
-def convert_mp3_to_wav(mp3_path: str, wav_path: str, sample_rate: int = 16000) -> str:
+def probe_duration(src_path: str):
+    """Container duration in seconds via ffprobe (reads headers only, no decode); None if unknown."""
+    cmd = ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", str(src_path)]
+    try:
+        out = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
+        return float(out.stdout.strip())
+    except (OSError, subprocess.TimeoutExpired, ValueError):
+        return None
+
+def decode_to_npy(src_path: str, npy_path: str, sample_rate: int = SAMPLE_RATE) -> str:
     """
-    Convert an MP3 file to WAV using ffmpeg (mono, PCM16, given sample rate).
-    Returns the output wav_path.
+    Decode any ffmpeg-readable file to mono float32 PCM at sample_rate and save it as .npy.
+    Written to a temp name unique to this process/call and renamed, so readers never see a
+    partial file and concurrent writers never share one.
+    Returns npy_path.
     """
-    mp3_path = Path(mp3_path)
-    wav_path = Path(wav_path)
-    wav_path.parent.mkdir(parents=True, exist_ok=True)
+    npy_path = Path(npy_path)
+    npy_path.parent.mkdir(parents=True, exist_ok=True)
 
     cmd = [
         "ffmpeg",
-        "-y",
-        "-i", str(mp3_path),
+        "-nostdin",
+        "-v", "error",
+        "-i", str(src_path),
         "-ac", "1",
         "-ar", str(sample_rate),
-        "-sample_fmt", "s16",
-        str(wav_path),
+        "-f", "f32le",
+        "-",
     ]
     proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     if proc.returncode != 0:
-        raise RuntimeError(f"ffmpeg conversion failed: {proc.stderr.decode(errors='ignore')[:4000]}")
-    return str(wav_path)
+        raise RuntimeError(f"ffmpeg decode failed: {proc.stderr.decode(errors='ignore')[:4000]}")
+
+    pcm = np.frombuffer(proc.stdout, dtype=np.float32)
+    part = npy_path.with_name(f"{npy_path.name}.{os.getpid()}.{uuid.uuid4().hex[:8]}.part")
+    try:
+        with open(part, "wb") as f:
+            np.save(f, pcm)
+        os.replace(part, npy_path)
+    finally:
+        part.unlink(missing_ok=True)
+    return str(npy_path)
+
+_DECODE_LOCKS: dict = {}
+_DECODE_LOCKS_GUARD = threading.Lock()
+
+def _decode_lock(key: str) -> threading.Lock:
+    with _DECODE_LOCKS_GUARD:
+        return _DECODE_LOCKS.setdefault(key, threading.Lock())
+
+def ensure_pcm(audio_path: str, sample_rate: int = SAMPLE_RATE) -> str:
+    """
+    Decode an upload once; every stage after that reads the cached .npy next to the audio.
+    Concurrent callers (VAD + transcription) wait for the same decode instead of repeating it,
+    across threads and across the inference pool's processes (flock on a sidecar .lock file).
+    """
+    npy = storage.pcm_path(audio_path)
+    if Path(npy).exists():
+        return npy
+    with _decode_lock(npy), open(npy + ".lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            if not Path(npy).exists():
+                if not ffmpeg_ok():
+                    raise RuntimeError("ffmpeg is not installed or not on PATH.")
+                decode_to_npy(audio_path, npy, sample_rate)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+    return npy
+
+def load_pcm(npy_path: str) -> np.ndarray:
+    """Memory-map decoded PCM (read-only, no copy)."""
+    return np.asarray(np.load(npy_path, mmap_mode="r"))
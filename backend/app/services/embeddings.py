@@ -0,0 +1,83 @@
+# backend/app/services/embeddings.py
+# Append-only store of pooled wav2vec2 embeddings:
+# - data/embeddings/vectors.f32 : raw float32 rows, L2-normalised (cosine = dot product)
+# - data/embeddings/meta.json   : {"dim": D}
+# - the row for each audio_id lives in the Embedding table (models/db.py)
+# Search memory-maps the matrix, so lookups never touch the model.
+
+import fcntl
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services import storage
+
+log = logging.getLogger("embeddings")
+
+_LOCK = threading.Lock()
+_MATRIX: Optional[np.ndarray] = None
+
+def _dim() -> Optional[int]:
+    p = Path(storage.EMBEDDINGS_META)
+    if not p.exists():
+        return None
+    with open(p) as f:
+        return int(json.load(f)["dim"])
+
+def append(vec: np.ndarray) -> int:
+    """Append one embedding and return its row number (safe across threads and processes)."""
+    vec = np.asarray(vec, dtype=np.float32).reshape(-1)
+    vec = vec / (np.linalg.norm(vec) + 1e-12)
+    with _LOCK, open(storage.EMBEDDINGS_PATH, "ab") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            dim = _dim()
+            if dim is None:
+                with open(storage.EMBEDDINGS_META, "w") as m:
+                    json.dump({"dim": int(vec.size)}, m)
+                dim = vec.size
+            if vec.size != dim:
+                raise ValueError(f"embedding dim {vec.size} != store dim {dim}")
+            f.seek(0, 2)
+            row = f.tell() // (dim * 4)
+            f.write(vec.tobytes())
+            f.flush()
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+    return int(row)
+
+def matrix() -> np.ndarray:
+    """Read-only memmap of all rows; re-mapped when the file has grown."""
+    global _MATRIX
+    dim = _dim()
+    path = Path(storage.EMBEDDINGS_PATH)
+    if dim is None or not path.exists():
+        return np.zeros((0, 0), dtype=np.float32)
+    rows = path.stat().st_size // (dim * 4)
+    with _LOCK:
+        if _MATRIX is None or _MATRIX.shape[0] != rows:
+            _MATRIX = np.memmap(path, dtype=np.float32, mode="r", shape=(rows, dim)) if rows else \
+                np.zeros((0, dim), dtype=np.float32)
+        return _MATRIX
+
+def top_k(query_row: int, candidate_rows: Sequence[int], k: int = 5) -> List[Tuple[int, float]]:
+    """
+    Cosine top-k of query_row against candidate_rows -> [(index into candidate_rows, score)],
+    best first. Rows may repeat: a deduplicated re-upload shares its original's row.
+    """
+    M = matrix()
+    rows = np.asarray(candidate_rows, dtype=np.int64)
+    if query_row >= M.shape[0] or rows.size == 0:
+        return []
+    idx = np.flatnonzero(rows < M.shape[0])
+    if idx.size == 0:
+        return []
+    scores = M[rows[idx]] @ M[query_row]
+    k = min(k, idx.size)
+    best = np.argpartition(-scores, k - 1)[:k]
+    best = best[np.argsort(-scores[best])]
+    return [(int(idx[i]), float(scores[i])) for i in best]
@@ -0,0 +1,145 @@
+# backend/app/services/inference.py
+# Dedicated process pool for model inference (wav2vec2 emotion, Whisper) and the numpy-heavy
+# preprocessing around it. Each process loads its models once, in the pool initializer, and
+# keeps them for its lifetime; callers hand over plain arguments and get back artifact paths
+# (plus a few scalars), never arrays. Nothing heavy runs in the API's threads or under its GIL.
+
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# --------------------------
+# Config (env-driven)
+# --------------------------
+PROCESSES = os.getenv("INFER_PROCESSES", "1") == "1"    # 0 = run inline (debugging, tests)
+PROCS     = int(os.getenv("INFER_PROCS", os.getenv("WORKER_CPU_SLOTS", "2")))
+# per-process BLAS/CTranslate2 threads; default splits the cores between the processes
+THREADS   = int(os.getenv("INFER_THREADS", "0")) or max(1, (os.cpu_count() or 1) // max(1, PROCS))
+
+# --------------------------
+# Logging
+# --------------------------
+log = logging.getLogger("inference")
+if not log.handlers:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+_WARM: Dict[int, Dict[str, Any]] = {}   # pid -> what _ping last reported (warmup or a finished call)
+# queue wait = submit -> a pool process starting the call (what ModelPool.stats measured in-process)
+_WAIT = {"calls": 0, "in_flight": 0, "wait_total_s": 0.0, "wait_max_s": 0.0}
+_WAIT_LOCK = threading.Lock()
+
+
+def _init_process() -> None:
+    """Runs once in every pool process: size thread pools, then load and warm the models."""
+    import torch
+    from app.services import transcribe as tx_service
+    from app.services import vad as vad_service
+
+    torch.set_num_threads(THREADS)
+    if not os.getenv("STT_CPU_THREADS"):
+        tx_service.CPU_THREADS = THREADS
+    vad_service.warmup()
+    tx_service.warmup()
+
+def _ping(hold_s: float = 0.0) -> Dict[str, Any]:
+    """What this process has loaded: the emotion model and which Whisper models."""
+    from app.services import transcribe as tx_service
+    from app.services import vad as vad_service
+    time.sleep(hold_s)   # keeps this process busy so concurrent pings land on different processes
+    return {"pid": os.getpid(), "emotion": vad_service.model_ready(),
+            "whisper": sorted(name for name, st in tx_service.pool_stats().items() if st["created"])}
+
+def _task(fn: Callable, submitted: float, *args: Any) -> Tuple[Any, Dict[str, Any], float]:
+    """Pool-side wrapper: the result, what the process that ran it has loaded, and how long
+    the call waited for a free process (wall clock; parent and pool share the host)."""
+    wait_s = max(0.0, time.time() - submitted)
+    return fn(*args), _ping(), wait_s
+
+def pool() -> ProcessPoolExecutor:
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                # spawn, not fork: the parent may be a uvicorn process with torch/ctranslate2 threads
+                _POOL = ProcessPoolExecutor(PROCS, mp_context=multiprocessing.get_context("spawn"),
+                                            initializer=_init_process)
+                log.info(f"Inference pool: {PROCS} processes x {THREADS} threads")
+    return _POOL
+
+def _discard(broken: ProcessPoolExecutor) -> None:
+    """Drop a pool whose process died (OOM kill, segfault in a native lib) so the next call builds a new one."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is broken:
+            _POOL = None
+            _WARM.clear()
+            log.warning("Inference pool broken; rebuilding")
+    broken.shutdown(wait=False, cancel_futures=True)
+
+def prewarm() -> None:
+    """Start every pool process (and so load its models) now instead of on the first upload."""
+    if not PROCESSES:
+        return
+    t0 = time.perf_counter()
+    futures = [pool().submit(_ping, 1.0) for _ in range(PROCS)]
+    wait(futures)
+    for f in futures:
+        if f.exception() is None:
+            info = f.result()
+            _WARM[info["pid"]] = info
+    log.info(f"Inference pool warm: {len(_WARM)}/{PROCS} processes in {time.perf_counter() - t0:.1f}s")
+
+def run(fn: Callable, *args: Any) -> Any:
+    """Call a module-level function in the pool (inline if INFER_PROCESSES=0) and wait for its result."""
+    if not PROCESSES:
+        return fn(*args)
+    with _WAIT_LOCK:
+        _WAIT["in_flight"] += 1
+    try:
+        p = pool()
+        try:
+            out, info, wait_s = p.submit(_task, fn, time.time(), *args).result()
+        except BrokenProcessPool:
+            # one retry on a fresh pool; a call that kills its process twice fails the job
+            _discard(p)
+            p = pool()
+            try:
+                out, info, wait_s = p.submit(_task, fn, time.time(), *args).result()
+            except BrokenProcessPool:
+                _discard(p)
+                raise
+    finally:
+        with _WAIT_LOCK:
+            _WAIT["in_flight"] -= 1
+    with _WAIT_LOCK:
+        _WAIT["calls"] += 1
+        _WAIT["wait_total_s"] += wait_s
+        _WAIT["wait_max_s"] = max(_WAIT["wait_max_s"], wait_s)
+    # every call refreshes its process's entry, so a rebuilt pool reports itself without a prewarm
+    _WARM[info["pid"]] = info
+    return out
+
+def stats() -> Dict[str, Any]:
+    """Per-process model readiness, as reported by the processes that actually run inference."""
+    procs = list(_WARM.values()) if PROCESSES else [_ping()]
+    with _WAIT_LOCK:
+        w = dict(_WAIT)
+    return {"processes": PROCS if PROCESSES else 0, "threads": THREADS,
+            "ready": bool(procs) and all(p["emotion"] for p in procs), "procs": procs,
+            "calls": w["calls"], "in_flight": w["in_flight"],
+            "wait_avg_ms": round(1000 * w["wait_total_s"] / w["calls"], 1) if w["calls"] else 0.0,
+            "wait_max_ms": round(1000 * w["wait_max_s"], 1)}
+
+def shutdown() -> None:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.shutdown(wait=False, cancel_futures=True)
+            _POOL = None
@@ -0,0 +1,188 @@
+# backend/app/services/jobs.py
+# Durable job queue on the app's SQLite database. The API enqueues pipeline stages; workers
+# (python -m app.worker, or the in-process worker when JOBS_INPROCESS=1) lease them, heartbeat
+# while running, and retry failures with exponential backoff. A worker that dies mid-job simply
+# stops heartbeating: once the lease expires another worker picks the job up again.
+
+import logging
+import os
+import traceback
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import case, delete, exists, func, insert, literal, nulls_first, or_, update
+from sqlmodel import Session, select
+
+from app.models.db import Audio, Job
+
+# --------------------------
+# Config (env-driven)
+# --------------------------
+LEASE_S       = float(os.getenv("JOBS_LEASE_S", "120"))      # renewed by the heartbeat while a job runs
+HEARTBEAT_S   = float(os.getenv("JOBS_HEARTBEAT_S", "20"))
+MAX_ATTEMPTS  = int(os.getenv("JOBS_MAX_ATTEMPTS", "3"))
+BACKOFF_S     = float(os.getenv("JOBS_BACKOFF_S", "5"))      # 5s, 10s, 20s, ...
+BACKOFF_MAX_S = float(os.getenv("JOBS_BACKOFF_MAX_S", "300"))
+RETAIN_S      = float(os.getenv("JOBS_RETAIN_S", str(7 * 86400)))   # finished jobs kept this long; 0 = forever
+# fair share: users are served round-robin (fewest running jobs, then least recently served);
+# interactive uploads go ahead of bulk ingest until a bulk job has waited FAIR_BULK_AGE_S
+FAIR_WINDOW_S   = float(os.getenv("FAIR_WINDOW_S", "3600"))     # "recently served" / wait-metrics horizon
+FAIR_BULK_AGE_S = float(os.getenv("FAIR_BULK_AGE_S", "1800"))   # 0 = bulk never jumps the class
+
+PRIORITIES = {"interactive": 0, "bulk": 1}
+
+# stages whose final failure leaves the entry usable (e.g. the draft transcript stays)
+NON_CRITICAL = {"refine"}
+
+# --------------------------
+# Logging
+# --------------------------
+log = logging.getLogger("jobs")
+if not log.handlers:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+
+
+def enqueue(s: Session, audio_id: int, stage: str, skip_failed: bool = False, refresh: bool = False) -> None:
+    """
+    Queue a stage for an entry (caller commits). Skipped if the stage is already queued or
+    running, or with skip_failed=True if a job for it already used up its attempts (DAG
+    scheduling: a non-critical stage the worker gave up on is not retried forever).
+    A single INSERT ... WHERE NOT EXISTS, so concurrent workers can't double-queue.
+    refresh=True makes the stage skip the LLM reply cache, also on a job that is already queued.
+    """
+    if refresh:
+        s.exec(update(Job).where(Job.audio_id == audio_id, Job.stage == stage, Job.status == "queued")
+               .values(refresh=True))
+    statuses = ("queued", "running", "failed") if skip_failed else ("queued", "running")
+    existing = select(Job.id).where(Job.audio_id == audio_id, Job.stage == stage, Job.status.in_(statuses))
+    now = datetime.utcnow()
+    # user and priority are copied from the entry so claim() can order without a join
+    row = select(literal(audio_id), literal(stage), literal("queued"), literal(0), literal(now), literal(now),
+                 literal(refresh), Audio.user_id, Audio.priority)
+    s.exec(insert(Job).from_select(
+        ["audio_id", "stage", "status", "attempts", "run_after", "created_at", "refresh", "user_id", "priority"],
+        row.where(Audio.id == audio_id, ~exists(existing)),
+    ))
+
+def _fair_candidates(runnable, now: datetime):
+    """Runnable job ids in fair-share order: priority class, then the user with the fewest
+    running jobs, then the user served longest ago, then FIFO within a user."""
+    user = func.coalesce(Job.user_id, "")
+    running = (
+        select(user.label("u"), func.count().label("n"))
+        .where(Job.status == "running", Job.lease_until >= now)
+        .group_by(user).subquery()
+    )
+    served = (
+        select(user.label("u"), func.max(Job.started_at).label("last"))
+        .where(Job.started_at >= now - timedelta(seconds=FAIR_WINDOW_S))
+        .group_by(user).subquery()
+    )
+    interactive = Job.priority <= PRIORITIES["interactive"]
+    if FAIR_BULK_AGE_S:
+        interactive = interactive | (Job.created_at < now - timedelta(seconds=FAIR_BULK_AGE_S))
+    klass = case((interactive, 0), else_=1)
+    return (
+        select(Job.id)
+        .outerjoin(running, running.c.u == user)
+        .outerjoin(served, served.c.u == user)
+        .where(runnable)
+        .order_by(klass, func.coalesce(running.c.n, 0), nulls_first(served.c.last), Job.run_after, Job.id)
+    )
+
+def claim(s: Session, worker_id: str, stages: Optional[Iterable[str]] = None) -> Optional[Job]:
+    """Lease the next runnable job (optionally only these stages): queued and due, or running with an expired lease."""
+    now = datetime.utcnow()
+    runnable = or_(
+        (Job.status == "queued") & (Job.run_after <= now),
+        (Job.status == "running") & (Job.lease_until < now),
+    )
+    if stages is not None:
+        runnable = runnable & Job.stage.in_(tuple(stages))
+    candidates = s.exec(_fair_candidates(runnable, now).limit(8)).all()
+    for job_id in candidates:
+        # the conditional UPDATE is the lock: only one worker sees rowcount == 1
+        res = s.exec(
+            update(Job).where(Job.id == job_id, runnable)
+            .values(status="running", worker_id=worker_id, attempts=Job.attempts + 1,
+                    lease_until=now + timedelta(seconds=LEASE_S), heartbeat_at=now, started_at=now)
+        )
+        s.commit()
+        if res.rowcount == 1:
+            return s.get(Job, job_id)
+    return None
+
+def heartbeat(s: Session, job_id: int, worker_id: str) -> bool:
+    """Extend the lease; False if the job was taken over by another worker."""
+    now = datetime.utcnow()
+    res = s.exec(
+        update(Job).where(Job.id == job_id, Job.worker_id == worker_id, Job.status == "running")
+        .values(lease_until=now + timedelta(seconds=LEASE_S), heartbeat_at=now)
+    )
+    s.commit()
+    return res.rowcount == 1
+
+def complete(s: Session, job: Job) -> None:
+    """Mark done (caller commits). Flushed right away so the transaction holds the write lock
+    before the caller reads anything to schedule dependents."""
+    job.status = "done"
+    job.lease_until = None
+    job.finished_at = datetime.utcnow()
+    s.add(job); s.flush()
+
+def fail(s: Session, job: Job, exc: BaseException) -> None:
+    """Schedule a retry with backoff, or give up after MAX_ATTEMPTS and mark the entry failed."""
+    job.last_error = "".join(traceback.format_exception_only(type(exc), exc)).strip()[:2000]
+    job.lease_until = None
+    if job.attempts < MAX_ATTEMPTS:
+        delay = min(BACKOFF_MAX_S, BACKOFF_S * 2 ** (job.attempts - 1))
+        job.status = "queued"
+        job.run_after = datetime.utcnow() + timedelta(seconds=delay)
+        log.warning(f"Job {job.id} ({job.stage}, audio {job.audio_id}) failed, retry in {delay:.0f}s: {job.last_error}")
+    else:
+        job.status = "failed"
+        job.finished_at = datetime.utcnow()
+        log.error(f"Job {job.id} ({job.stage}, audio {job.audio_id}) failed after {job.attempts} attempts: {job.last_error}")
+        if job.stage not in NON_CRITICAL:
+            a = s.get(Audio, job.audio_id)
+            if a:
+                a.status = "failed"; s.add(a)
+    s.add(job); s.commit()
+
+def prune(s: Session) -> int:
+    """Delete done/failed jobs finished more than RETAIN_S ago, so the table (and every claim's
+    scan of it) stays bounded; returns how many went. Kept at least as long as the fair-share window."""
+    if not RETAIN_S:
+        return 0
+    cutoff = datetime.utcnow() - timedelta(seconds=max(RETAIN_S, FAIR_WINDOW_S))
+    res = s.exec(delete(Job).where(Job.status.in_(("done", "failed")), Job.finished_at < cutoff))
+    s.commit()
+    return res.rowcount
+
+def stats(s: Session) -> Dict[str, Dict[str, int]]:
+    """Pending work per status and stage, e.g. {"queued": {"vad": 3}, "running": {...}}."""
+    rows = s.exec(
+        select(Job.status, Job.stage, func.count()).where(Job.status.in_(("queued", "running")))
+        .group_by(Job.status, Job.stage)
+    ).all()
+    out: Dict[str, Dict[str, int]] = {"queued": {}, "running": {}}
+    for status, stage, n in rows:
+        out[status][stage] = n
+    return out
+
+def wait_stats(s: Session, limit: int = 20) -> Dict[str, Dict[str, float]]:
+    """Per-user queue wait (runnable -> claimed) over the last FAIR_WINDOW_S, worst average first."""
+    now = datetime.utcnow()
+    user = func.coalesce(Job.user_id, "")
+    wait_s = (func.julianday(Job.started_at) - func.julianday(Job.run_after)) * 86400.0
+    rows = s.exec(
+        select(user, func.count(), func.avg(wait_s), func.max(wait_s))
+        .where(Job.started_at >= now - timedelta(seconds=FAIR_WINDOW_S))
+        .group_by(user).order_by(func.avg(wait_s).desc()).limit(limit)
+    ).all()
+    queued = dict(s.exec(select(user, func.count()).where(Job.status == "queued").group_by(user)).all())
+    return {
+        (u or "-"): {"jobs": n, "queued": queued.get(u, 0),
+                     "wait_avg_s": round(avg or 0.0, 2), "wait_max_s": round(mx or 0.0, 2)}
+        for u, n, avg, mx in rows
+    }
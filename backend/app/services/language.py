@@ -0,0 +1,67 @@
+# backend/app/services/language.py
+# Per-user language profile, learned from Whisper's detected language on earlier entries.
+# Once a user's entries agree consistently, transcription passes the language as a hint
+# and Whisper skips its detection pass; every LANG_RECHECK_EVERY hinted entries we detect
+# again so a user who switches language is picked up.
+
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import case, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session, select
+
+from app.core.db import engine
+from app.models.db import LanguageProfile
+
+MIN_SUPPORT    = int(os.getenv("LANG_MIN_SUPPORT", "3"))        # net agreeing detections before hinting
+MIN_PROB       = float(os.getenv("LANG_MIN_PROB", "0.7"))       # detections below this are ignored
+RECHECK_EVERY  = int(os.getenv("LANG_RECHECK_EVERY", "20"))     # 0 = never re-detect once confident
+
+log = logging.getLogger("language")
+
+def _profile(s: Session, user_id: str) -> Optional[LanguageProfile]:
+    return s.exec(select(LanguageProfile).where(LanguageProfile.user_id == user_id)).first()
+
+def hint_for(s: Session, user_id: Optional[str]) -> Optional[str]:
+    """Language to pass to Whisper for this user, or None to let it detect."""
+    if not user_id:
+        return None
+    p = _profile(s, user_id)
+    if not p or not p.language or p.matches < MIN_SUPPORT:
+        return None
+    if RECHECK_EVERY and p.hinted >= RECHECK_EVERY:
+        return None
+    return p.language
+
+def record(user_id: Optional[str], tx: Dict[str, Any]) -> None:
+    """
+    Update the profile from a finished transcript, in its own transaction. Concurrent
+    transcriptions for one user both land: the row is upserted and the counters are
+    updated in SQL. Failures are logged, never raised, so they can't fail the stage.
+    """
+    if not user_id:
+        return
+    P = LanguageProfile
+    values: Dict[str, Any] = {"updated_at": datetime.utcnow()}
+    if tx.get("language_hint"):
+        values["hinted"] = P.hinted + 1
+    else:
+        lang, prob = tx.get("language"), tx.get("language_probability") or 0.0
+        if lang and prob >= MIN_PROB:
+            # majority vote (Boyer-Moore): disagreements erode support until another language
+            # takes over; every right-hand side reads the row's old values
+            agrees, takes_over = P.language == lang, P.matches <= 1
+            values["detections"] = P.detections + 1
+            values["language"] = case((agrees, P.language), (takes_over, lang), else_=P.language)
+            values["matches"] = case((agrees, P.matches + 1), (takes_over, 1), else_=P.matches - 1)
+        values["hinted"] = 0
+    try:
+        with Session(engine) as s:
+            s.exec(insert(P).values(user_id=user_id).on_conflict_do_nothing(index_elements=["user_id"]))
+            s.exec(update(P).where(P.user_id == user_id).values(**values))
+            s.commit()
+    except Exception:
+        log.exception(f"Language profile update failed for user {user_id}")
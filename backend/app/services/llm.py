@@ -0,0 +1,228 @@
+# backend/app/services/llm.py
+# Shared Anthropic client for the LLM stages (summary, response). One AsyncAnthropic client on a
+# background event loop, over one pooled httpx connection pool, so calls reuse warm TLS
+# connections; per-call timeouts; a global semaphore caps in-flight requests across all worker
+# threads. Pipeline code is synchronous, so create_for_stage() blocks on the loop.
+#
+# Calls that name a prompt `template` go through the on-disk reply cache (llm_cache.py) unless
+# use_cache=False.
+#
+# Tests: set LLM_BASE_URL to a local stub server, or install a client with set_client_factory().
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import anthropic
+
+from app.services import llm_cache
+
+# --------------------------
+# Config (env-driven)
+# --------------------------
+API_KEY         = os.getenv("ANTHROPIC_API_KEY")
+BASE_URL        = os.getenv("LLM_BASE_URL") or None          # e.g. http://127.0.0.1:8089 for a stub
+MODEL           = os.getenv("LLM_MODEL", "claude-opus-4-1-20250805")
+TIMEOUT_S       = float(os.getenv("LLM_TIMEOUT_S", "60"))     # whole request (read) timeout
+CONNECT_S       = float(os.getenv("LLM_CONNECT_TIMEOUT_S", "5"))
+MAX_RETRIES     = int(os.getenv("LLM_MAX_RETRIES", "2"))      # SDK retries (429/5xx/connection errors)
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))  # in-flight requests, process-wide
+MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", str(MAX_CONCURRENCY)))
+PROMPT_CACHE    = os.getenv("LLM_PROMPT_CACHE", "1") == "1"  # mark static system prompts for provider caching
+FAST_MODEL      = os.getenv("LLM_FAST_MODEL", "claude-haiku-4-5")
+# share of a stage's budget held back for each fallback tier while an earlier tier runs
+FALLBACK_SHARE  = float(os.getenv("LLM_FALLBACK_SHARE", "0.3"))
+
+def _stage(name: str, models: str, budget_s: str, max_tokens: str) -> Dict[str, Any]:
+    key = name.upper()
+    return {
+        # tried in order within one stage-wide deadline of budget_s
+        "models": [m.strip() for m in os.getenv(f"LLM_{key}_MODELS", models).split(",") if m.strip()],
+        "budget_s": float(os.getenv(f"LLM_{key}_BUDGET_S", budget_s)),
+        "max_tokens": int(os.getenv(f"LLM_{key}_MAX_TOKENS", max_tokens)),
+    }
+
+# per-stage model tiers and latency budgets
+STAGES: Dict[str, Dict[str, Any]] = {
+    "summary": _stage("summary", FAST_MODEL, "10", "200"),                        # 1–3 sentences
+    "response": _stage("response", f"{MODEL},{FAST_MODEL}", "20", "300"),
+    "summary_response": _stage("summary_response", f"{MODEL},{FAST_MODEL}", "30", "600"),
+}
+
+# --------------------------
+# Logging
+# --------------------------
+log = logging.getLogger("llm")
+if not log.handlers:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+
+
+def _default_client() -> anthropic.AsyncAnthropic:
+    # build Timeout/Limits from the SDK's own classes: newer SDKs ship their own httpx fork
+    # and reject plain httpx objects
+    timeout = anthropic.Timeout(TIMEOUT_S, connect=CONNECT_S)
+    limits = type(anthropic.DEFAULT_CONNECTION_LIMITS)(
+        max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS
+    )
+    http = anthropic.DefaultAsyncHttpxClient(timeout=timeout, limits=limits)
+    return anthropic.AsyncAnthropic(api_key=API_KEY or "stub", base_url=BASE_URL, timeout=timeout,
+                                    max_retries=MAX_RETRIES, http_client=http)
+
+_factory: Callable[[], Any] = _default_client
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_client = None
+_sem: Optional[asyncio.Semaphore] = None
+_lock = threading.Lock()
+_usage = {"calls": 0, "input_tokens": 0, "output_tokens": 0, "cache_read_tokens": 0, "cache_write_tokens": 0}
+
+def enabled() -> bool:
+    """True when there is something to call (an API key, a stub URL, or an injected client)."""
+    return bool(API_KEY or BASE_URL or _factory is not _default_client)
+
+def set_client_factory(factory: Optional[Callable[[], Any]]) -> None:
+    """Use factory() (anything with an async .messages.create) instead of AsyncAnthropic; None restores it."""
+    global _factory
+    reset()
+    _factory = factory or _default_client
+
+def _ensure_loop() -> asyncio.AbstractEventLoop:
+    global _loop, _client, _sem
+    if _loop is None:
+        with _lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="llm-loop", daemon=True).start()
+
+                async def _init():
+                    # client and semaphore must be created on the loop that uses them
+                    return _factory(), asyncio.Semaphore(MAX_CONCURRENCY)
+
+                _client, _sem = asyncio.run_coroutine_threadsafe(_init(), loop).result()
+                _loop = loop
+    return _loop
+
+def reset() -> None:
+    """Close the client and stop the loop (tests, or after changing config)."""
+    global _loop, _client, _sem
+    with _lock:
+        loop, client = _loop, _client
+        _loop = _client = _sem = None
+    if loop is None:
+        return
+    close = getattr(client, "close", None)
+    if close is not None:
+        try:
+            asyncio.run_coroutine_threadsafe(close(), loop).result(5)
+        except Exception:
+            pass
+    loop.call_soon_threadsafe(loop.stop)
+
+async def acreate(timeout: Optional[float] = None, **kwargs: Any):
+    """messages.create on the shared client, under the concurrency cap. Must run on the llm loop."""
+    kwargs.setdefault("model", MODEL)
+    async with _sem:
+        return await _client.messages.create(timeout=timeout or TIMEOUT_S, **kwargs)
+
+def _cached(template: Optional[str], use_cache: bool, kwargs: Dict[str, Any],
+            count: bool = True) -> Tuple[Optional[str], Any]:
+    """(cache key, cached Message or None); (None, None) when this call is not cacheable."""
+    if not (template and use_cache and llm_cache.ENABLED):
+        return None, None
+    k = llm_cache.key(template, kwargs)
+    hit = llm_cache.get(k, count=count)
+    return k, (anthropic.types.Message.model_validate(hit) if hit is not None else None)
+
+def _call(timeout: Optional[float], template: Optional[str], k: Optional[str], kwargs: Dict[str, Any],
+          cache_ttl_s: Optional[float] = None):
+    loop = _ensure_loop()
+    coro = acreate(timeout=timeout, **kwargs)
+    if timeout:
+        coro = asyncio.wait_for(coro, timeout)   # hard deadline, including the concurrency-cap wait and SDK retries
+    msg = asyncio.run_coroutine_threadsafe(coro, loop).result()
+    _record_usage(template, msg)
+    if k and hasattr(msg, "model_dump"):
+        llm_cache.put(k, template, msg.model_dump(mode="json"), ttl_s=cache_ttl_s)
+    return msg
+
+def create_for_stage(stage: str, template: Optional[str] = None, use_cache: bool = True,
+                     **kwargs: Any) -> Tuple[Any, str]:
+    """
+    Blocking messages.create on the stage's model tiers, for sync callers (worker threads), within
+    one deadline of the stage's budget_s. With a template name (e.g. "summary-v1"; bump it when
+    the prompt changes) replies are served from / stored in the reply cache. Each tier
+    runs with what is left of the budget minus FALLBACK_SHARE of it per later tier; on timeout
+    or API error the next (faster) one gets the rest. A tier's cached reply is served in its turn,
+    so a fallback reply is only used when the tiers before it just failed, and it is cached for
+    llm_cache.FALLBACK_TTL_S only. Returns (message, model that answered); raises the last error
+    if every tier failed, so callers keep their own text fallback.
+    """
+    cfg = STAGES[stage]
+    kwargs.setdefault("max_tokens", cfg["max_tokens"])
+    models = cfg["models"]
+    deadline = time.monotonic() + cfg["budget_s"]
+    last: Optional[BaseException] = None
+    for i, model in enumerate(models):
+        call = {**kwargs, "model": model}
+        # one counted lookup per stage call: the primary's
+        k, hit = _cached(template, use_cache, call, count=(i == 0))
+        if hit is not None:
+            return hit, model
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            last = asyncio.TimeoutError()
+            break
+        later = len(models) - 1 - i
+        timeout = max(remaining - later * FALLBACK_SHARE * cfg["budget_s"], remaining / (later + 1))
+        try:
+            return _call(timeout, template, k, call, llm_cache.FALLBACK_TTL_S if i else None), model
+        except (asyncio.TimeoutError, anthropic.APIError) as e:
+            log.warning(f"LLM {stage}: {model} failed ({type(e).__name__}); trying the next tier.")
+            last = e
+    raise last or RuntimeError(f"No models configured for LLM stage '{stage}'")
+
+def complete_for_stage(stage: str, prompt: str, temperature: float = 0.7, system: Optional[Any] = None,
+                       **kwargs: Any) -> Tuple[str, str]:
+    """One user turn on the stage's model tiers -> (reply text, model)."""
+    if system is not None:
+        kwargs["system"] = system
+    msg, model = create_for_stage(stage, messages=[{"role": "user", "content": prompt}],
+                                  temperature=temperature, **kwargs)
+    return text(msg), model
+
+def cached_system(prompt: str) -> List[Dict[str, Any]]:
+    """System block for a fixed instruction prefix, marked for provider-side prompt caching."""
+    block: Dict[str, Any] = {"type": "text", "text": prompt}
+    if PROMPT_CACHE:
+        block["cache_control"] = {"type": "ephemeral"}
+    return [block]
+
+def _record_usage(template: Optional[str], msg) -> None:
+    u = getattr(msg, "usage", None)
+    if u is None:
+        return
+    read = getattr(u, "cache_read_input_tokens", 0) or 0
+    write = getattr(u, "cache_creation_input_tokens", 0) or 0
+    fresh = getattr(u, "input_tokens", 0) or 0
+    with _lock:
+        _usage["calls"] += 1
+        _usage["input_tokens"] += fresh
+        _usage["output_tokens"] += getattr(u, "output_tokens", 0) or 0
+        _usage["cache_read_tokens"] += read
+        _usage["cache_write_tokens"] += write
+    log.info(f"LLM {template or '-'}: input={fresh} cache_read={read} cache_write={write} "
+             f"output={getattr(u, 'output_tokens', 0)}")
+
+def usage_stats() -> Dict[str, Any]:
+    """Token totals since start; prompt_cache_hit_rate = cached share of all input tokens."""
+    with _lock:
+        out: Dict[str, Any] = dict(_usage)
+    total_in = out["input_tokens"] + out["cache_read_tokens"] + out["cache_write_tokens"]
+    out["prompt_cache_hit_rate"] = round(out["cache_read_tokens"] / total_in, 3) if total_in else None
+    return out
+
+def text(msg) -> str:
+    """Concatenated text blocks of a Message."""
+    return "".join(getattr(b, "text", "") or "" for b in (msg.content or [])).strip()
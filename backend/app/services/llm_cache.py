@@ -0,0 +1,114 @@
+# backend/app/services/llm_cache.py
+# On-disk cache of LLM replies, in its own SQLite file (not app.db). Keyed by a fingerprint of
+# the prompt template version and the full request (model, temperature, max_tokens, system,
+# messages, tools), so re-triggered or re-processed entries with unchanged inputs cost nothing.
+# Least-recently-used rows are evicted past LLM_CACHE_MAX_ENTRIES / LLM_CACHE_MAX_MB; rows older
+# than LLM_CACHE_TTL_S (or their own shorter ttl, e.g. fallback-model replies) are ignored and purged.
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+# --------------------------
+# Config (env-driven)
+# --------------------------
+ENABLED     = os.getenv("LLM_CACHE", "1") == "1"
+PATH        = os.getenv("LLM_CACHE_PATH", "data/llm_cache.db")
+TTL_S       = float(os.getenv("LLM_CACHE_TTL_S", str(30 * 86400)))   # 0 = never expires
+MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+MAX_MB      = float(os.getenv("LLM_CACHE_MAX_MB", "50"))
+FALLBACK_TTL_S = float(os.getenv("LLM_CACHE_FALLBACK_TTL_S", "3600"))  # replies from a stage's fallback tiers
+EVICT_EVERY = 50   # puts between eviction sweeps
+
+_conn: Optional[sqlite3.Connection] = None
+_lock = threading.Lock()
+_counts = {"hits": 0, "misses": 0, "puts": 0}
+
+
+def _db() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        Path(PATH).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(PATH, check_same_thread=False, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY, template TEXT, value TEXT NOT NULL, size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL, used_at REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0)"
+        )
+        if "expires_at" not in {r[1] for r in conn.execute("PRAGMA table_info(llm_cache)")}:
+            conn.execute("ALTER TABLE llm_cache ADD COLUMN expires_at REAL")   # per-row ttl, NULL = TTL_S only
+        conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_used_at ON llm_cache (used_at)")
+        _conn = conn
+    return _conn
+
+def key(template: str, request: Dict[str, Any]) -> str:
+    """Fingerprint of a prompt template version + the request body (timeouts etc. excluded by the caller)."""
+    blob = json.dumps({"template": template, "request": request}, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+def get(k: str, count: bool = True) -> Optional[Dict[str, Any]]:
+    """Cached value or None. count=False keeps the lookup out of the hit/miss stats (secondary
+    lookups within one logical request)."""
+    now = time.time()
+    with _lock:
+        row = _db().execute("SELECT value, created_at, expires_at FROM llm_cache WHERE key = ?", (k,)).fetchone()
+        if row and ((TTL_S and row[1] < now - TTL_S) or (row[2] is not None and row[2] < now)):
+            _db().execute("DELETE FROM llm_cache WHERE key = ?", (k,))
+            row = None
+        if row is None:
+            if count:
+                _counts["misses"] += 1
+            return None
+        _db().execute("UPDATE llm_cache SET used_at = ?, hits = hits + 1 WHERE key = ?", (now, k))
+        if count:
+            _counts["hits"] += 1
+    return json.loads(row[0])
+
+def put(k: str, template: str, value: Dict[str, Any], ttl_s: Optional[float] = None) -> None:
+    """Store a reply; ttl_s shortens its life below TTL_S."""
+    blob = json.dumps(value)
+    now = time.time()
+    with _lock:
+        _db().execute(
+            "INSERT OR REPLACE INTO llm_cache (key, template, value, size, created_at, used_at, expires_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (k, template, blob, len(blob), now, now, now + ttl_s if ttl_s else None),
+        )
+        _counts["puts"] += 1
+        if _counts["puts"] % EVICT_EVERY == 0:
+            _evict(now)
+
+def _evict(now: float) -> None:
+    """Drop expired rows, then everything past the newest MAX_ENTRIES rows / MAX_MB bytes (LRU)."""
+    db = _db()
+    if TTL_S:
+        db.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - TTL_S,))
+    db.execute("DELETE FROM llm_cache WHERE expires_at < ?", (now,))
+    db.execute(
+        "DELETE FROM llm_cache WHERE key IN ("
+        " SELECT key FROM (SELECT key,"
+        "  ROW_NUMBER() OVER (ORDER BY used_at DESC) AS n,"
+        "  SUM(size) OVER (ORDER BY used_at DESC) AS total FROM llm_cache)"
+        " WHERE n > ? OR total > ?)",
+        (MAX_ENTRIES, int(MAX_MB * 1024 * 1024)),
+    )
+
+def clear() -> None:
+    with _lock:
+        _db().execute("DELETE FROM llm_cache")
+
+def stats() -> Dict[str, Any]:
+    if not ENABLED:
+        return {"enabled": False}
+    with _lock:
+        entries, size = _db().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+    lookups = _counts["hits"] + _counts["misses"]
+    return {"enabled": True, "entries": entries, "mb": round(size / 1048576, 2),
+            "hits": _counts["hits"], "misses": _counts["misses"],
+            "hit_rate": round(_counts["hits"] / lookups, 3) if lookups else None}
@@ -0,0 +1,69 @@
+# backend/app/services/model_pool.py
+# A bounded pool of model instances shared by background threads:
+# - at most `size` callers hold a model at once; the rest wait on a semaphore
+# - instances are built lazily by `factory` and reused
+# - queue-wait metrics are kept so /health can show whether we're saturated
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List
+
+log = logging.getLogger("model_pool")
+
+class ModelPool:
+    def __init__(self, name: str, factory: Callable[[], Any], size: int = 1):
+        self.name = name
+        self.factory = factory
+        self.size = max(1, size)
+        self._sem = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._free: List[Any] = []
+        self.created = 0
+        self.waiting = 0
+        self.in_use = 0
+        self.acquired = 0
+        self.wait_total_s = 0.0
+        self.wait_max_s = 0.0
+
+    @contextmanager
+    def acquire(self):
+        t0 = time.monotonic()
+        with self._lock:
+            self.waiting += 1
+        self._sem.acquire()
+        wait = time.monotonic() - t0
+        with self._lock:
+            self.waiting -= 1
+            self.in_use += 1
+            self.acquired += 1
+            self.wait_total_s += wait
+            self.wait_max_s = max(self.wait_max_s, wait)
+            model = self._free.pop() if self._free else None
+        if wait > 1.0:
+            log.info(f"[{self.name}] waited {wait:.1f}s for a model ({self.size} in pool)")
+        try:
+            if model is None:
+                model = self.factory()
+                with self._lock:
+                    self.created += 1
+            yield model
+        finally:
+            with self._lock:
+                if model is not None:
+                    self._free.append(model)
+                self.in_use -= 1
+            self._sem.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": self.size,
+                "created": self.created,
+                "in_use": self.in_use,
+                "waiting": self.waiting,
+                "acquired": self.acquired,
+                "wait_avg_ms": round(1000 * self.wait_total_s / self.acquired, 1) if self.acquired else 0.0,
+                "wait_max_ms": round(1000 * self.wait_max_s, 1),
+            }
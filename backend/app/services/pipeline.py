@@ -0,0 +1,288 @@
+# backend/app/services/pipeline.py
+# Pipeline stages, one function per job stage, and the DAG between them. Each stage takes an
+# audio id and owns the DB rows for its output; it knows nothing about what runs next. When a
+# stage's job completes, schedule() queues every stage whose declared inputs are now ready, in
+# the same transaction. Exceptions propagate: the worker retries (see jobs.py) and marks the
+# entry failed once the attempts are used up.
+#
+# Model stages are split in two: a _compute_* function that runs in the inference process pool
+# (decode, model, write the JSON) and returns paths, and the run_* side that records them in the DB.
+
+import json
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from sqlmodel import Session, select
+
+from app.core.db import engine
+from app.models.db import Audio, VAD, Transcript, Summary, Response, Embedding
+from app.services import storage
+from app.services import artifacts
+from app.services import audio_utils
+from app.services import jobs
+from app.services import inference
+from app.services import vad as vad_service
+from app.services import transcribe as tx_service
+from app.services import summary as sm_service
+from app.services import response as rp_service
+from app.services import speech as speech_service
+from app.services import embeddings as emb_service
+from app.services import language as lang_service
+
+
+def _mark_ready(a: Audio) -> None:
+    if a.vad_ready and a.transcript_ready and a.summary_ready and a.response_ready:
+        a.status = "ready"
+
+# --------------------------
+# Dedup (see artifacts.py)
+# --------------------------
+def _link_cached_vad(s: Session, a: Audio) -> bool:
+    """Point this entry at an identical upload's VAD (and embedding row) instead of recomputing."""
+    art = artifacts.lookup(s, a.content_hash, "vad", vad_service.config_key())
+    if not art:
+        return False
+    s.add(VAD(audio_id=a.id, storage_path=art.storage_path))
+    src = s.exec(select(Embedding).where(Embedding.audio_id == art.audio_id)).first()
+    if src:
+        s.add(Embedding(audio_id=a.id, user_id=a.user_id, row=src.row))
+    a.vad_ready = True
+    _mark_ready(a)
+    s.add(a); s.commit()
+    return True
+
+def _link_cached_transcript(s: Session, a: Audio) -> bool:
+    """Point this entry at an identical upload's full-quality transcript instead of re-running Whisper."""
+    art = artifacts.lookup(s, a.content_hash, "transcript", tx_service.config_key())
+    if not art:
+        return False
+    s.add(Transcript(audio_id=a.id, storage_path=art.storage_path, summary=None,
+                     version=tx_service.TIERS["final"]["version"]))
+    a.transcript_ready = True
+    _mark_ready(a)
+    s.add(a); s.commit()
+    return True
+
+# --------------------------
+# Inference (runs in the pool processes; arguments and results stay small and picklable)
+# --------------------------
+def _compute_vad(audio_id: int, audio_path: str) -> Dict[str, Any]:
+    pcm_path = audio_utils.ensure_pcm(audio_path)   # decoded once, shared with transcription
+    speech_path = speech_service.ensure_speech_regions(audio_id, pcm_path)
+    result = vad_service.compute_vad_from_wav(
+        pcm_path, audio_id=audio_id, speech_path=speech_path, embeddings=True
+    )
+    row = emb_service.append(result.pop("embedding"))
+    path = storage.vad_json_path(audio_id)
+    vad_service.save_vad_json(result, path)
+    return {"path": path, "embedding_row": row}
+
+def _compute_transcript(audio_id: int, audio_path: str, tier: str, language: Optional[str],
+                        out_path: str, stream: bool = True) -> Dict[str, Any]:
+    pcm_path = audio_utils.ensure_pcm(audio_path)   # decoded once, shared with VAD
+    stream_path = storage.transcript_stream_path(audio_id) if stream else None  # live segments for /transcript/stream
+    tx = tx_service.transcribe(pcm_path, stream_path=stream_path, tier=tier, language=language)
+    tx_service.save_transcript_json(tx, out_path)
+    # only what the DB side needs (version + language profile inputs), not the segments
+    out = {k: tx.get(k) for k in ("version", "language", "language_probability", "language_hint")}
+    out["path"] = out_path
+    return out
+
+# --------------------------
+# Stages
+# --------------------------
+def run_vad(audio_id: int):
+    with Session(engine) as s:
+        a = s.get(Audio, audio_id)
+        if not a or a.vad_ready:
+            return
+        if _link_cached_vad(s, a):
+            return
+        out = inference.run(_compute_vad, a.id, a.storage_path)
+        path = out["path"]
+
+        s.add(VAD(audio_id=a.id, storage_path=path))
+        s.add(Embedding(audio_id=a.id, user_id=a.user_id, row=out["embedding_row"]))
+        artifacts.remember(s, a.content_hash, "vad", vad_service.config_key(), a.id, path)
+        a.vad_ready = True
+        _mark_ready(a)
+        s.add(a); s.commit()
+
+def run_transcription(audio_id: int):
+    with Session(engine) as s:
+        a = s.get(Audio, audio_id)
+        if not a or a.transcript_ready:
+            return
+        if _link_cached_transcript(s, a):
+            return
+        # two-tier: a greedy draft unblocks summary/response; refinement rewrites it afterwards
+        tier = "draft" if tx_service.TWO_TIER else "final"
+        hint = lang_service.hint_for(s, a.user_id)   # skip language detection for known users
+        path = storage.transcript_json_path(a.id)
+        tx = inference.run(_compute_transcript, a.id, a.storage_path, tier, hint, path)
+        s.add(Transcript(audio_id=a.id, storage_path=path, summary=None, version=tx["version"]))  # keep column for back-compat
+        if tier == "final":
+            artifacts.remember(s, a.content_hash, "transcript", tx_service.config_key(), a.id, path)
+        a.transcript_ready = True
+        _mark_ready(a)
+        s.add(a); s.commit()
+        lang_service.record(a.user_id, tx)   # own transaction, after the transcript is safe
+
+def run_refinement(audio_id: int):
+    """Full-quality pass (beam search + word timestamps) that replaces the draft transcript in place."""
+    with Session(engine) as s:
+        a = s.get(Audio, audio_id)
+        t = s.exec(select(Transcript).where(Transcript.audio_id == audio_id)).first()
+        if not a or not t or t.version >= tx_service.TIERS["final"]["version"]:
+            return
+        with open(t.storage_path) as f:
+            draft_language = json.load(f).get("language")   # the draft already settled the language
+        tx = inference.run(_compute_transcript, a.id, a.storage_path, "final", draft_language,
+                           t.storage_path, False)
+        t.version = tx["version"]
+        s.add(t)
+        artifacts.remember(s, a.content_hash, "transcript", tx_service.config_key(), a.id, t.storage_path)
+        s.commit()
+
+def run_summary(audio_id: int, use_cache: bool = True):
+    with Session(engine) as s:
+        a = s.get(Audio, audio_id)
+        if not a:
+            return
+        tx = s.exec(select(Transcript).where(Transcript.audio_id == audio_id)).first()
+        if not tx:
+            return
+        obj = sm_service.summarize_from_transcript(tx.storage_path, use_cache=use_cache)
+        path = storage.summary_json_path(a.id)
+        sm_service.save_summary_json(obj, path)
+        s.add(Summary(audio_id=a.id, storage_path=path, source=obj.get("summary_source")))
+        a.summary_ready = True
+        _mark_ready(a)
+        s.add(a); s.commit()
+
+def run_response(audio_id: int, use_cache: bool = True):
+    with Session(engine) as s:
+        a = s.get(Audio, audio_id)
+        if not a:
+            return
+        tx = s.exec(select(Transcript).where(Transcript.audio_id == audio_id)).first()
+        sm = s.exec(select(Summary).where(Summary.audio_id == audio_id)).first()
+        vd = s.exec(select(VAD).where(VAD.audio_id == audio_id)).first()
+        if not tx or not sm:
+            return
+        emotion_path = vd.storage_path if vd else None
+        obj = rp_service.generate_response(
+            transcript_path=tx.storage_path,
+            summary_path=sm.storage_path,
+            emotion_path=emotion_path,
+            use_cache=use_cache,
+        )
+        path = storage.response_json_path(a.id)
+        rp_service.save_response_json(obj, path)
+        s.add(Response(audio_id=a.id, storage_path=path))
+        a.response_ready = True
+        _mark_ready(a)
+        s.add(a); s.commit()
+
+def run_summary_response(audio_id: int, use_cache: bool = True):
+    """Fused LLM stage (LLM_FUSED=1): one call, written to the same JSONs and rows as the two stages."""
+    with Session(engine) as s:
+        a = s.get(Audio, audio_id)
+        if not a:
+            return
+        tx = s.exec(select(Transcript).where(Transcript.audio_id == audio_id)).first()
+        vd = s.exec(select(VAD).where(VAD.audio_id == audio_id)).first()
+        if not tx:
+            return
+        obj = rp_service.generate_summary_and_response(
+            transcript_path=tx.storage_path,
+            emotion_path=vd.storage_path if vd else None,
+            use_cache=use_cache,
+        )
+        sm_path = storage.summary_json_path(a.id)
+        meta = {"model": obj["model"], "latency_ms": obj["latency_ms"], "fused": True}
+        sm_service.save_summary_json({"summary": obj["summary"], "summary_source": obj["summary_source"], **meta}, sm_path)
+        rp_path = storage.response_json_path(a.id)
+        rp_service.save_response_json({"response": obj["response"], **meta}, rp_path)
+        s.add(Summary(audio_id=a.id, storage_path=sm_path, source=obj["summary_source"]))
+        s.add(Response(audio_id=a.id, storage_path=rp_path))
+        a.summary_ready = True
+        a.response_ready = True
+        _mark_ready(a)
+        s.add(a); s.commit()
+
+# --------------------------
+# DAG
+# --------------------------
+# job stage name -> function; the worker dispatches on this
+STAGES: Dict[str, Callable[[int], None]] = {
+    "vad": run_vad,
+    "transcribe": run_transcription,
+    "refine": run_refinement,
+    "summary": run_summary,
+    "response": run_response,
+    "summary_response": run_summary_response,
+}
+
+# stage -> stages whose output it reads; a stage is queued as soon as all of them are done
+DEPENDS: Dict[str, Tuple[str, ...]] = {
+    "vad": (),
+    "transcribe": (),
+    "refine": ("transcribe",),
+    "summary": ("transcribe",),
+    "response": ("summary", "vad"),   # emotion cues are an input, not "whatever exists by then"
+}
+# inputs of every stage, including the single LLM stages that /summarize and /respond run in fused mode
+INPUTS: Dict[str, Tuple[str, ...]] = {**DEPENDS, "summary_response": ("transcribe", "vad")}
+if rp_service.FUSED:
+    # one LLM round trip instead of two; "/summarize" and "/respond" still run the single stages
+    del DEPENDS["summary"], DEPENDS["response"]
+    DEPENDS["summary_response"] = ("transcribe", "vad")
+
+# a stage re-run on request (/summarize) also rebuilds what was made from its output
+RERUN: Dict[str, Tuple[str, ...]] = {
+    "summary": ("response",),
+}
+
+# model inference (CPU-bound, run in worker processes); the rest wait on the LLM API
+CPU_STAGES = frozenset({"vad", "transcribe", "refine"})
+
+def run_stage(stage: str, audio_id: int, refresh: bool = False) -> None:
+    """Module-level entry point so worker processes can be handed (stage, audio_id).
+    refresh: the job asked for a fresh LLM reply (only the LLM stages take use_cache)."""
+    if refresh:
+        STAGES[stage](audio_id, use_cache=False)
+    else:
+        STAGES[stage](audio_id)
+
+def _done(s: Session, a: Audio) -> Set[str]:
+    done = {name for name, flag in (("vad", a.vad_ready), ("transcribe", a.transcript_ready),
+                                    ("summary", a.summary_ready), ("response", a.response_ready)) if flag}
+    t = s.exec(select(Transcript).where(Transcript.audio_id == a.id)).first()
+    if t and t.version >= tx_service.TIERS["final"]["version"]:
+        done.add("refine")   # nothing to refine (single-tier, dedup link, or already refined)
+    if a.summary_ready and a.response_ready:
+        done.add("summary_response")
+    return done
+
+def missing_inputs(s: Session, audio_id: int, stage: str) -> List[str]:
+    """Inputs of `stage` that this entry does not have yet (for the manual triggers)."""
+    a = s.get(Audio, audio_id)
+    done = _done(s, a) if a else set()
+    return [i for i in INPUTS[stage] if i not in done]
+
+def schedule(s: Session, audio_id: int, finished: Optional[str] = None) -> None:
+    """
+    Queue every stage whose inputs are done and whose own output is not (decided from the
+    entry's ready flags, not from which jobs exist), and when `finished` (the stage that just
+    completed) was a re-run, its RERUN stages again (caller commits).
+    """
+    a = s.get(Audio, audio_id)
+    if not a or a.status == "failed":
+        return
+    done = _done(s, a)
+    for stage, inputs in DEPENDS.items():
+        if stage not in done and all(i in done for i in inputs):
+            jobs.enqueue(s, audio_id, stage, skip_failed=True)
+    for stage in RERUN.get(finished, ()):
+        if stage in done:
+            jobs.enqueue(s, audio_id, stage)
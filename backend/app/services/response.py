@@ -1,9 +1,14 @@
-import os, json, logging, traceback
+import os, json, logging, time, traceback
 from pathlib import Path
 from typing import Dict, Any, Optional
-import anthropic
 
-ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
+from app.services import llm
+
+FUSED = os.getenv("LLM_FUSED", "0") == "1"   # one call for summary + response (pipeline "summary_response" stage)
+
+# LLM cache key parts; bump when the corresponding prompt changes
+TEMPLATE = "response-v2"
+FUSED_TEMPLATE = "summary_response-v2"
 #ANTHROPIC_MODEL = os.getenv("ANTHROPIC_MODEL", "claude-3-5-sonnet-latest")
 
 log = logging.getLogger("response")
@@ -14,24 +19,9 @@ def load_json(path: str) -> Dict[str, Any]:
     with open(path) as f:
         return json.load(f)
 
-def generate_response(transcript_path: str, summary_path: str, emotion_path: Optional[str]) -> Dict[str, Any]:
-    tx = load_json(transcript_path)
-    sm = load_json(summary_path)
-    em = load_json(emotion_path) if (emotion_path and Path(emotion_path).exists()) else None
-
-    transcript_text = tx.get("transcript", "") or ""
-    summary_text = sm.get("summary", "") or transcript_text
-    valence = em["vad"]["valence"] if em else None
-    arousal = em["vad"]["arousal"] if em else None
-    dominance = em["vad"]["dominance"] if em else None
-
-    prompt = (
-        "You are an empathetic assistant for a mental health journaling app.\n"
-        "Using the provided summary (and emotion cues if present), write a 1–3 sentence response "
-        "that acknowledges feelings and offers a gentle next step.\n\n"
-        f"Summary: {summary_text}\n"
-        f"Emotion (optional): valence={valence}, arousal={arousal}, dominance={dominance}\n\n"
-        '''
+# how to read the emotion cues and what the reply should sound like; shared by the
+# response-only prompt and the fused summary + response call
+RESPONSE_GUIDE = '''
 **Instructions:**
 1. Interpret the users emotional state from these three values.
    - If Valence is low -> assume sadness, frustration, or distress.
@@ -54,27 +44,120 @@ def generate_response(transcript_path: str, summary_path: str, emotion_path: Opt
    - Offer supportive or inspirational suggestions
    - Do NOT make it too formal; more cordial, light-hearted, friend-like, without being TOO informal
    - Never give medical advice or directives beyond safe coping strategies.'''
-   "Output format: Respond only with the text of your reply. the end of the response should ALWAYS end with **And finally, here is a tune to wrap up your day :)**. No JSON. No additional commentary."
+
+# fixed per deploy, so it is sent as a cache_control prefix (see llm.cached_system)
+SYSTEM = (
+    "You are an empathetic assistant for a mental health journaling app.\n"
+    "Using the provided summary (and emotion cues if present), write a 1–3 sentence response "
+    "that acknowledges feelings and offers a gentle next step.\n"
+    + RESPONSE_GUIDE +
+    "\n\nOutput format: Respond only with the text of your reply. the end of the response should ALWAYS end with "
+    "**And finally, here is a tune to wrap up your day :)**. No JSON. No additional commentary."
+)
+
+def _emotion_line(em: Optional[Dict[str, Any]]) -> str:
+    valence = em["vad"]["valence"] if em else None
+    arousal = em["vad"]["arousal"] if em else None
+    dominance = em["vad"]["dominance"] if em else None
+    return f"Emotion (optional): valence={valence}, arousal={arousal}, dominance={dominance}"
+
+def generate_response(transcript_path: str, summary_path: str, emotion_path: Optional[str],
+                      use_cache: bool = True) -> Dict[str, Any]:
+    tx = load_json(transcript_path)
+    sm = load_json(summary_path)
+    em = load_json(emotion_path) if (emotion_path and Path(emotion_path).exists()) else None
+
+    transcript_text = tx.get("transcript", "") or ""
+    summary_text = sm.get("summary", "") or transcript_text
+
+    # static instructions go in the (prompt-cached) system block; only the entry's data follows
+    prompt = (
+        f"Summary: {summary_text}\n"
+        f"{_emotion_line(em)}"
     )
     #print(prompt)
     reply = summary_text  # fallback
-    if ANTHROPIC_API_KEY:
+    model = None
+    t0 = time.perf_counter()
+    if llm.enabled():
         try:
-            client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-            msg = client.messages.create(
-                model="claude-opus-4-1-20250805",
-                max_tokens=300,
-                temperature=0.7,
-                messages=[{"role": "user", "content": prompt}],
-            )
-            reply = (msg.content[0].text or "").strip() or summary_text
+            # model tiers, max_tokens and latency budget: llm.STAGES["response"]
+            reply, model = llm.complete_for_stage("response", prompt, temperature=0.7, system=llm.cached_system(SYSTEM),
+                                                  template=TEMPLATE, use_cache=use_cache)
+            reply = reply or summary_text
         except Exception:
             #print(e)
             log.warning("Anthropic response failed; using summary as reply.\n" + traceback.format_exc())
 
-    return {"response": reply}
+    return {"response": reply, "model": model, "latency_ms": int((time.perf_counter() - t0) * 1000)}
 
 def save_response_json(obj: Dict[str, Any], out_path: str) -> None:
     Path(out_path).parent.mkdir(parents=True, exist_ok=True)
     with open(out_path, "w") as f:
         json.dump(obj, f)
+
+# --------------------------
+# Fused summary + response (LLM_FUSED=1)
+# --------------------------
+FUSED_TOOL = {
+    "name": "journal_reply",
+    "description": "Return the summary of the journal entry and the reply to the user.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "summary": {"type": "string", "description": "The journal entry summarized in 1–3 supportive sentences."},
+            "response": {"type": "string", "description": "The reply to the user, following the instructions."},
+        },
+        "required": ["summary", "response"],
+    },
+}
+
+FUSED_SYSTEM = (
+    "You are an empathetic assistant for a mental health journaling app.\n"
+    "First summarize the user's journal entry in 1–3 supportive sentences. Then, using that summary "
+    "(and emotion cues if present), write a 1–3 sentence response that acknowledges feelings and "
+    "offers a gentle next step.\n"
+    + RESPONSE_GUIDE +
+    "\n\nOutput format: call journal_reply with the summary text and the reply text. The reply should "
+    "ALWAYS end with **And finally, here is a tune to wrap up your day :)**."
+)
+
+def generate_summary_and_response(transcript_path: str, emotion_path: Optional[str],
+                                  use_cache: bool = True) -> Dict[str, Any]:
+    """
+    One structured call instead of summarize_from_transcript + generate_response. Returns the
+    fields of both ("summary", "summary_source", "response") with the same fallbacks.
+    """
+    tx = load_json(transcript_path)
+    em = load_json(emotion_path) if (emotion_path and Path(emotion_path).exists()) else None
+    transcript_text = tx.get("transcript", "") or ""
+
+    prompt = (
+        f'Journal entry (verbatim):\n"{transcript_text}"\n'
+        f"{_emotion_line(em)}"
+    )
+    summary_text, source, reply = transcript_text, "transcript", transcript_text   # fallbacks
+    model = None
+    t0 = time.perf_counter()
+    if llm.enabled():
+        try:
+            # model tiers, max_tokens (room for both parts) and latency budget: llm.STAGES["summary_response"]
+            msg, model = llm.create_for_stage(
+                "summary_response",
+                system=llm.cached_system(FUSED_SYSTEM),
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.7,
+                tools=[FUSED_TOOL],
+                tool_choice={"type": "tool", "name": FUSED_TOOL["name"]},
+                template=FUSED_TEMPLATE,
+                use_cache=use_cache,
+            )
+            out = next(b.input for b in msg.content if getattr(b, "type", None) == "tool_use")
+            summary_text = (out.get("summary") or "").strip() or transcript_text
+            source = "anthropic"
+            reply = (out.get("response") or "").strip() or summary_text
+        except Exception:
+            log.warning("Anthropic fused summary/response failed; falling back to transcript.\n" + traceback.format_exc())
+
+    return {"summary": summary_text, "summary_source": source, "response": reply,
+            "model": model, "latency_ms": int((time.perf_counter() - t0) * 1000)}
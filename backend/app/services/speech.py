@@ -0,0 +1,82 @@
+# backend/app/services/speech.py
+# Speech regions for an upload, detected once with Silero VAD (the same detector
+# faster-whisper's vad_filter uses) and saved as data/speech/{audio_id}.json so
+# later stages can skip silence without re-running detection.
+
+import json
+import threading
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+from app.services import audio_utils, storage
+
+_LOCK = threading.Lock()
+
+def detect_speech(pcm: np.ndarray, sampling_rate: int = audio_utils.SAMPLE_RATE) -> List[Dict[str, int]]:
+    """[{"start": sample, "end": sample}, ...] for the speech in a mono float32 signal."""
+    regions = get_speech_timestamps(pcm, VadOptions(), sampling_rate=sampling_rate)
+    return [{"start": int(r["start"]), "end": int(r["end"])} for r in regions]
+
+def ensure_speech_regions(audio_id: int, pcm_path: str) -> str:
+    """Detect speech once per upload; returns the path of the saved regions JSON."""
+    path = storage.speech_json_path(audio_id)
+    with _LOCK:
+        if not Path(path).exists():
+            pcm = audio_utils.load_pcm(pcm_path)
+            obj = {
+                "sample_rate": audio_utils.SAMPLE_RATE,
+                "num_samples": int(len(pcm)),
+                "regions": detect_speech(pcm),
+            }
+            save_speech_json(obj, path)
+    return path
+
+def load_speech_json(path: str) -> Dict:
+    with open(path) as f:
+        return json.load(f)
+
+def save_speech_json(obj: Dict, out_path: str) -> None:
+    Path(out_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(out_path, "w") as f:
+        json.dump(obj, f)
+
+class SpeechSignal:
+    """
+    The speech regions of a signal, viewed as one contiguous signal without copying it.
+    Slicing copies only the requested span, so windowing it stays bounded in memory.
+    """
+
+    def __init__(self, signal: np.ndarray, regions: List[Dict[str, int]]):
+        self.signal = signal
+        self.regions = [(r["start"], r["end"]) for r in regions if r["end"] > r["start"]]
+        lengths = [e - s for s, e in self.regions]
+        self.offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+    def __getitem__(self, key: slice) -> np.ndarray:
+        start, stop, _ = key.indices(len(self))
+        pieces = []
+        i = max(0, int(np.searchsorted(self.offsets, start, side="right")) - 1)
+        while start < stop and i < len(self.regions):
+            src_start, src_end = self.regions[i]
+            lo = src_start + (start - int(self.offsets[i]))
+            hi = min(src_end, lo + (stop - start))
+            pieces.append(self.signal[lo:hi])
+            start += hi - lo
+            i += 1
+        if not pieces:
+            return np.zeros(0, dtype=np.float32)
+        return pieces[0] if len(pieces) == 1 else np.concatenate(pieces)
+
+    def source_ms(self, t_ms, sampling_rate: int = audio_utils.SAMPLE_RATE) -> List[int]:
+        """Map times on the speech-only timeline back to the original recording."""
+        samples = np.asarray(t_ms, dtype=np.float64) * sampling_rate / 1000
+        idx = np.clip(np.searchsorted(self.offsets, samples, side="right") - 1, 0, len(self.regions) - 1)
+        starts = np.array([s for s, _ in self.regions], dtype=np.float64)
+        src = starts[idx] + (samples - self.offsets[idx])
+        return (src / sampling_rate * 1000).astype(int).tolist()
@@ -3,13 +3,17 @@ import shutil
 
 AUDIO_DIR = Path("data/audio")
 VAD_DIR = Path("data/vad")
+SPEECH_DIR = Path("data/speech")
 TX_DIR = Path("data/transcripts")
 SUMMARY_DIR = Path("data/summary")
 RESPONSE_DIR = Path("data/response")
 MUSIC_DIR = Path("data/music")
 TMP_DIR = Path("data/tmp")
+EMBEDDINGS_DIR = Path("data/embeddings")
+EMBEDDINGS_PATH = str(EMBEDDINGS_DIR / "vectors.f32")
+EMBEDDINGS_META = str(EMBEDDINGS_DIR / "meta.json")
 
-for d in (AUDIO_DIR, VAD_DIR, TX_DIR, SUMMARY_DIR, RESPONSE_DIR, TMP_DIR, MUSIC_DIR):
+for d in (AUDIO_DIR, VAD_DIR, SPEECH_DIR, TX_DIR, SUMMARY_DIR, RESPONSE_DIR, TMP_DIR, MUSIC_DIR, EMBEDDINGS_DIR):
     d.mkdir(parents=True, exist_ok=True)
 
 def move_to_audio(tmp_upload_path: str, final_name: str) -> str:
@@ -17,12 +21,32 @@ def move_to_audio(tmp_upload_path: str, final_name: str) -> str:
     shutil.move(tmp_upload_path, dest)
     return str(dest)
 
+def move_to_audio_by_hash(tmp_upload_path: str, content_hash: str, filename: str) -> str:
+    # content-addressed: identical uploads share one file (and its decoded .npy)
+    dest = AUDIO_DIR / f"{content_hash}{Path(filename).suffix.lower()}"
+    if dest.exists():
+        Path(tmp_upload_path).unlink(missing_ok=True)
+    else:
+        shutil.move(tmp_upload_path, dest)
+    return str(dest)
+
+def pcm_path(audio_path: str) -> str:
+    # decoded 16 kHz mono float32, stored next to the upload
+    return str(Path(audio_path).with_suffix(".npy"))
+
 def vad_json_path(audio_id: int) -> str:
     return str(VAD_DIR / f"{audio_id}.json")
 
+def speech_json_path(audio_id: int) -> str:
+    return str(SPEECH_DIR / f"{audio_id}.json")
+
 def transcript_json_path(audio_id: int) -> str:
     return str(TX_DIR / f"{audio_id}.json")
 
+def transcript_stream_path(audio_id: int) -> str:
+    # one JSON line per segment, appended as Whisper produces them (live stream + resume)
+    return str(TX_DIR / f"{audio_id}.stream.jsonl")
+
 def summary_json_path(audio_id: int) -> str:
     return str(SUMMARY_DIR / f"{audio_id}.json")
 
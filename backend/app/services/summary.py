@@ -1,45 +1,46 @@
-import os, json, logging, traceback
+import json, logging, time, traceback
 from pathlib import Path
 from typing import Dict, Any, Optional
-import anthropic
 
-ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
+from app.services import llm
+
 #ANTHROPIC_MODEL = os.getenv("ANTHROPIC_MODEL", "claude-3-5-sonnet-latest")
 
 log = logging.getLogger("summary")
 if not log.handlers:
     logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
 
-def summarize_from_transcript(transcript_json_path: str) -> Dict[str, Any]:
+TEMPLATE = "summary-v1"   # LLM cache key part; bump when the prompt below changes
+
+def summarize_from_transcript(transcript_json_path: str, use_cache: bool = True) -> Dict[str, Any]:
     with open(transcript_json_path) as f:
         tx = json.load(f)
     transcript_text = tx.get("transcript", "") or ""
 
     summary_text = transcript_text
     source = "transcript"
-    if ANTHROPIC_API_KEY:
+    model = None
+    t0 = time.perf_counter()
+    if llm.enabled():
         try:
-            client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-            msg = client.messages.create(
-                model="claude-opus-4-1-20250805",
-                max_tokens=300,
+            # model tiers, max_tokens and latency budget: llm.STAGES["summary"]
+            reply, model = llm.complete_for_stage(
+                "summary",
+                "You are an empathetic assistant for a mental health journaling app.\n"
+                "Summarize the user's journal entry in 1–3 supportive sentences.\n\n"
+                f'Journal entry (verbatim):\n"{transcript_text}"\n\n'
+                "Reply with only the summary text.",
                 temperature=0.7,
-                messages=[{
-                    "role": "user",
-                    "content": (
-                        "You are an empathetic assistant for a mental health journaling app.\n"
-                        "Summarize the user's journal entry in 1–3 supportive sentences.\n\n"
-                        f'Journal entry (verbatim):\n"{transcript_text}"\n\n'
-                        "Reply with only the summary text."
-                    ),
-                }],
+                template=TEMPLATE,
+                use_cache=use_cache,
             )
-            summary_text = (msg.content[0].text or "").strip() or transcript_text
+            summary_text = reply or transcript_text
             source = "anthropic"
         except Exception:
             log.warning("Anthropic summary failed; falling back to transcript.\n" + traceback.format_exc())
 
-    return {"summary": summary_text, "summary_source": source}
+    return {"summary": summary_text, "summary_source": source,
+            "model": model, "latency_ms": int((time.perf_counter() - t0) * 1000)}
 
 def save_summary_json(obj: Dict[str, Any], out_path: str) -> None:
     Path(out_path).parent.mkdir(parents=True, exist_ok=True)
@@ -14,7 +14,10 @@ import json
 import requests
 
 import anthropic
-from faster_whisper import WhisperModel
+from faster_whisper import BatchedInferencePipeline, WhisperModel
+
+from app.services import audio_utils
+from app.services.model_pool import ModelPool
 
 # --------------------------
 # Config (env-driven)
@@ -24,6 +27,30 @@ DEVICE       = os.getenv("STT_DEVICE", "cpu")
 COMPUTE_TYPE = os.getenv("STT_COMPUTE", "int8")
 LANGUAGE     = os.getenv("STT_LANGUAGE", "")   # "" = auto
 VAD_FILTER   = os.getenv("STT_VAD", "1") == "1"
+BATCHED      = os.getenv("STT_BATCHED", "0") == "1"          # chunked, batched decoding (BatchedInferencePipeline)
+BATCH_SIZE   = int(os.getenv("STT_BATCH_SIZE", "8"))
+BATCHED_MIN_S = float(os.getenv("STT_BATCHED_MIN_S", "120"))  # shorter files stay on sequential beam search
+POOL_SIZE    = int(os.getenv("STT_POOL_SIZE", "1"))           # concurrent transcriptions (model instances)
+CPU_THREADS  = int(os.getenv("STT_CPU_THREADS", "0")) or max(1, (os.cpu_count() or 1) // POOL_SIZE)
+NUM_WORKERS  = int(os.getenv("STT_NUM_WORKERS", "1"))
+TWO_TIER     = os.getenv("STT_TWO_TIER", "1") == "1"          # fast draft first, full-quality refinement after
+DRAFT_MODEL  = os.getenv("STT_DRAFT_MODEL", "") or MODEL_NAME  # e.g. "tiny.en"; "" = same model as final
+DRAFT_POOL_SIZE = int(os.getenv("STT_DRAFT_POOL_SIZE", str(POOL_SIZE)))
+# the draft is what /transcript/stream serves live, so it keeps word timestamps unless told otherwise
+DRAFT_WORDS  = os.getenv("STT_DRAFT_WORDS", "1") == "1"
+
+# decoding settings per tier; "version" is what the stored transcript record carries
+TIERS: Dict[str, Dict[str, Any]] = {
+    "draft": {"model": DRAFT_MODEL, "beam_size": 1, "word_timestamps": DRAFT_WORDS, "version": 1},
+    "final": {"model": MODEL_NAME, "beam_size": 5, "word_timestamps": True, "version": 2},
+}
+
+def config_key(tier: str = "final") -> str:
+    """Identifies the settings a transcript was produced with; part of the dedup cache key."""
+    opts = TIERS[tier]
+    return (f"{opts['model']}|{COMPUTE_TYPE}|beam={opts['beam_size']}|words={int(opts['word_timestamps'])}"
+            f"|vad={int(VAD_FILTER)}|lang={LANGUAGE or 'auto'}|v{opts['version']}")
+
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
 SUNO_API_KEY      = os.getenv("SUNO_API_KEY")
 
@@ -35,10 +62,8 @@ if not log.handlers:
     logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
 
 # --------------------------
-# Model cache
+# Model pool
 # --------------------------
-_MODEL: Optional[WhisperModel] = None
-
 def ffmpeg_ok() -> bool:
     try:
         out = subprocess.run(["ffmpeg", "-version"], capture_output=True, text=True)
@@ -46,14 +71,45 @@ def ffmpeg_ok() -> bool:
     except Exception:
         return False
 
-def get_model() -> WhisperModel:
-    """Lazy-load Faster-Whisper."""
-    global _MODEL
-    if _MODEL is None:
-        log.info(f"Loading Faster-Whisper model '{MODEL_NAME}' on {DEVICE} ({COMPUTE_TYPE})...")
-        _MODEL = WhisperModel(MODEL_NAME, device=DEVICE, compute_type=COMPUTE_TYPE)
-        log.info("Model loaded.")
-    return _MODEL
+def _load_model(name: str = MODEL_NAME) -> WhisperModel:
+    """Load one Faster-Whisper instance; cpu_threads is split across the pool so we don't oversubscribe."""
+    log.info(f"Loading Faster-Whisper model '{name}' on {DEVICE} ({COMPUTE_TYPE}, "
+             f"cpu_threads={CPU_THREADS}, num_workers={NUM_WORKERS})...")
+    model = WhisperModel(name, device=DEVICE, compute_type=COMPUTE_TYPE,
+                         cpu_threads=CPU_THREADS, num_workers=NUM_WORKERS)
+    log.info("Model loaded.")
+    return model
+
+# one pool per model name (the draft tier may use a smaller model)
+_POOLS: Dict[str, ModelPool] = {
+    MODEL_NAME: ModelPool(f"whisper:{MODEL_NAME}", lambda: _load_model(MODEL_NAME), size=POOL_SIZE),
+}
+if DRAFT_MODEL not in _POOLS:
+    _POOLS[DRAFT_MODEL] = ModelPool(f"whisper:{DRAFT_MODEL}", lambda: _load_model(DRAFT_MODEL), size=DRAFT_POOL_SIZE)
+
+def acquire_model(name: str = MODEL_NAME):
+    """Context manager: hold one pooled WhisperModel; blocks while all of that model's instances are busy."""
+    return _POOLS[name].acquire()
+
+def pool_stats() -> Dict[str, Any]:
+    return {name: pool.stats() for name, pool in _POOLS.items()}
+
+def warmup() -> None:
+    """Build one instance of every tier's model so the first transcription is not cold."""
+    for name in {TIERS["final"]["model"], TIERS["draft"]["model"] if TWO_TIER else MODEL_NAME}:
+        try:
+            with acquire_model(name):
+                pass
+        except Exception:
+            log.exception(f"Whisper warmup failed for '{name}'; will load lazily on first use.")
+
+def use_batched(audio) -> bool:
+    """Batch long inputs only; duration is known up front for decoded PCM, else assume long."""
+    if not BATCHED:
+        return False
+    if isinstance(audio, str):
+        return True
+    return len(audio) / audio_utils.SAMPLE_RATE >= BATCHED_MIN_S
 
 # --------------------------
 # Voice Emotion Stub (replace with ML model later)
@@ -235,50 +291,123 @@ def generate_music_from_prompt(prompt: Dict[str, Any]) -> Optional[str]:
 #     }
 
 
-def transcribe(filepath: str) -> Dict[str, Any]:
+def _load_input(filepath: str):
     p = Path(filepath)
     if not p.exists() or not p.is_file():
         raise RuntimeError(f"Audio not found: {filepath}")
+    if p.suffix == ".npy":
+        # already decoded to 16 kHz mono float32 (audio_utils.ensure_pcm); no ffmpeg pass
+        return audio_utils.load_pcm(str(p))
     if not ffmpeg_ok():
         raise RuntimeError("ffmpeg is not installed or not on PATH.")
+    return str(p)
+
+def segment_record(seg) -> Dict[str, Any]:
+    """Materialize one faster-whisper Segment into a compact JSON-able record (words nested)."""
+    return {
+        "id": getattr(seg, "id", None),
+        "start": getattr(seg, "start", None),
+        "end": getattr(seg, "end", None),
+        "text": getattr(seg, "text", None),
+        "avg_logprob": getattr(seg, "avg_logprob", None),
+        "no_speech_prob": getattr(seg, "no_speech_prob", None),
+        "compression_ratio": getattr(seg, "compression_ratio", None),
+        "words": [
+            {"word": w.word, "start": w.start, "end": w.end, "prob": getattr(w, "probability", None)}
+            for w in (getattr(seg, "words", None) or [])
+        ],
+    }
 
-    model = get_model()
-    lang = LANGUAGE.strip() or None
-    segments, info = model.transcribe(
-        str(p), vad_filter=VAD_FILTER, word_timestamps=True, language=lang, beam_size=5
-    )
-
-    transcript_text = " ".join((getattr(seg, "text", "") or "").strip() for seg in segments if getattr(seg, "text", None))
-
-    out_segments: List[Dict[str, Any]] = [
-        {
-            "id": getattr(seg, "id", None),
-            "start": getattr(seg, "start", None),
-            "end": getattr(seg, "end", None),
-            "text": getattr(seg, "text", None),
-            "avg_logprob": getattr(seg, "avg_logprob", None),
-            "no_speech_prob": getattr(seg, "no_speech_prob", None),
-            "compression_ratio": getattr(seg, "compression_ratio", None),
-        }
-        for seg in segments
-    ]
-    out_words: List[Dict[str, Any]] = [
-        {"word": w.word, "start": w.start, "end": w.end, "prob": getattr(w, "probability", None)}
-        for seg in segments for w in (getattr(seg, "words", []) or [])
-    ]
+def stream_segments(filepath: str, model: WhisperModel, batched: Optional[bool] = None, tier: str = "final",
+                    language: Optional[str] = None):
+    """
+    Start ONE decoding pass -> (info, iterator of segment records, batch_size | None).
+    faster-whisper's segments are a lazy generator that can only be consumed once,
+    so every consumer must build what it needs from these records. Decoding happens while
+    the iterator is consumed, so keep `model` checked out until then.
+    batched: force (True/False) the batched pipeline; None = decide from STT_BATCHED + duration.
+    tier: "final" (beam 5 + word timestamps) or "draft" (greedy), see TIERS.
+    language: hint (e.g. from the user's language profile); STT_LANGUAGE still wins when set,
+    and with neither Whisper runs its language-detection pass.
+    """
+    audio = _load_input(filepath)
+    lang = LANGUAGE.strip() or language or None
+    opts = TIERS[tier]
+    if batched if batched is not None else use_batched(audio):
+        # batched wrapper around the same model: VAD-split chunks decoded BATCH_SIZE at a time
+        segments, info = BatchedInferencePipeline(model=model).transcribe(
+            audio, vad_filter=True, word_timestamps=opts["word_timestamps"], language=lang,
+            beam_size=opts["beam_size"], batch_size=BATCH_SIZE,
+        )
+        batch_size = BATCH_SIZE
+    else:
+        segments, info = model.transcribe(
+            audio, vad_filter=VAD_FILTER, word_timestamps=opts["word_timestamps"], language=lang,
+            beam_size=opts["beam_size"],
+        )
+        batch_size = None
+    return info, (segment_record(seg) for seg in segments), batch_size
+
+def build_transcript(info, records: List[Dict[str, Any]], batch_size: Optional[int] = None,
+                     tier: str = "final") -> Dict[str, Any]:
+    """Assemble the stored transcript JSON from already-materialized segment records."""
+    texts: List[str] = []
+    out_segments: List[Dict[str, Any]] = []
+    out_words: List[Dict[str, Any]] = []
+    for rec in records:
+        text = (rec.get("text") or "").strip()
+        if text:
+            texts.append(text)
+        out_segments.append({k: v for k, v in rec.items() if k != "words"})
+        out_words.extend(rec.get("words") or [])
 
     return {
         "engine": "faster-whisper",
-        "model": MODEL_NAME,
+        "model": TIERS[tier]["model"],
+        "tier": tier,                     # "draft" is replaced by "final" once refinement finishes
+        "version": TIERS[tier]["version"],
         "device": DEVICE,
         "compute_type": COMPUTE_TYPE,
         "duration": getattr(info, "duration", None),
         "language": getattr(info, "language", None),
-        "transcript": transcript_text,   # <-- ONLY transcription here
+        "language_probability": getattr(info, "language_probability", None),
+        "batch_size": batch_size,   # None = sequential decoding
+        "transcript": " ".join(texts),   # <-- ONLY transcription here
         "segments": out_segments,
         "words": out_words,
     }
 
+def transcribe(filepath: str, stream_path: Optional[str] = None, batched: Optional[bool] = None,
+               tier: str = "final", language: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Transcribe in one pass. With stream_path, each segment record is also appended to that
+    JSONL file as soon as it is decoded (for /transcript/stream and reconnecting clients).
+    tier="draft" is the fast first pass used when STT_TWO_TIER=1.
+    language: skip detection and decode in this language (see services/language.py).
+    """
+    with acquire_model(TIERS[tier]["model"]) as model:
+        info, records, batch_size = stream_segments(filepath, model, batched=batched, tier=tier,
+                                                    language=language)
+        if not stream_path:
+            tx = build_transcript(info, list(records), batch_size, tier)
+            tx["language_hint"] = language
+            return tx
+
+        done: List[Dict[str, Any]] = []
+        Path(stream_path).parent.mkdir(parents=True, exist_ok=True)
+        # each attempt writes a new file (new inode) instead of truncating the old one, so
+        # readers still following a failed attempt notice the switch and start over
+        part = f"{stream_path}.{os.getpid()}.part"
+        with open(part, "w") as f:
+            os.replace(part, stream_path)
+            for rec in records:
+                f.write(json.dumps(rec) + "\n")
+                f.flush()
+                done.append(rec)
+    tx = build_transcript(info, done, batch_size, tier)
+    tx["language_hint"] = language
+    return tx
+
 # def transcribe(filepath: str) -> Dict[str, Any]:
 #     """
 #     Run Faster-Whisper on an audio FILE PATH (not UploadFile), then:
@@ -432,9 +561,12 @@ def transcribe(filepath: str) -> Dict[str, Any]:
 #     }
 
 def save_transcript_json(tx: Dict[str, Any], out_path: str) -> None:
+    # write-then-rename: the refinement pass replaces a transcript that clients may be reading
     Path(out_path).parent.mkdir(parents=True, exist_ok=True)
-    with open(out_path, "w") as f:
+    tmp = f"{out_path}.tmp"
+    with open(tmp, "w") as f:
         json.dump(tx, f)
+    os.replace(tmp, out_path)
 
 # def save_transcript_json(tx: Dict[str, Any], out_path: str) -> None:
 #     Path(out_path).parent.mkdir(parents=True, exist_ok=True)
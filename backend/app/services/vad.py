@@ -1,5 +1,6 @@
 from typing import Dict, List
-import numpy as np, json
+import os, json, logging, threading
+import numpy as np
 from pathlib import Path
 import soundfile as sf
 import numpy as np
@@ -14,11 +15,54 @@ from transformers import AutoFeatureExtractor, AutoModelForAudioClassification
 import librosa
 from datetime import datetime, timezone
 
+from app.services import audio_utils
+from app.services import speech as speech_service
+from app.services.vad_batch import EmotionBatcher
+
+# --------------------------
+# Config (env-driven)
+# --------------------------
+MODEL_NAME = os.getenv("VAD_MODEL", "audeering/wav2vec2-large-robust-12-ft-emotion-msp-dim")
+DEVICE     = os.getenv("VAD_DEVICE", "cpu")
+COMPUTE    = os.getenv("VAD_COMPUTE", "float32")   # float32 | int8 (dynamic quant) | onnx
+ONNX_PATH  = os.getenv("VAD_ONNX_PATH", "data/models/vad_emotion.onnx")  # see scripts/export_vad_onnx.py
+WARMUP     = os.getenv("VAD_WARMUP", "1") == "1"   # load + warm the model at app startup
+WINDOWED   = os.getenv("VAD_WINDOWED", "1") == "1" # fixed-length overlapping windows (flat memory)
+WINDOW_S   = float(os.getenv("VAD_WINDOW_S", "8"))
+HOP_S      = float(os.getenv("VAD_HOP_S", "4"))
+BATCH_SIZE = int(os.getenv("VAD_BATCH", "4"))       # windows per forward pass
+# share forward passes across concurrent uploads. Off by default with the inference pool
+# (INFER_PROCESSES=1): each pool process runs one job at a time, so the batcher would never see
+# a second upload and every window batch would only wait out VAD_BATCH_WAIT_MS.
+BATCHER    = os.getenv("VAD_BATCHER", "0" if os.getenv("INFER_PROCESSES", "1") == "1" else "1") == "1"
+BATCH_WAIT_MS = int(os.getenv("VAD_BATCH_WAIT_MS", "20"))
+BUCKET_S   = float(os.getenv("VAD_BUCKET_S", "1.0")) # length bucket width for padding
+SPEECH_ONLY = os.getenv("VAD_SPEECH_ONLY", "1") == "1" # skip silence using the saved speech regions
+
+ARTIFACT_VERSION = 1   # bump when the VAD JSON layout or math changes (invalidates the dedup cache)
+
+def config_key() -> str:
+    """Identifies the settings a VAD JSON was computed with; part of the dedup cache key."""
+    windows = f"w{WINDOW_S:g}/{HOP_S:g}" if WINDOWED else "full"
+    return f"{MODEL_NAME}|{COMPUTE}|{windows}|speech={int(SPEECH_ONLY)}|v{ARTIFACT_VERSION}"
+
+# --------------------------
+# Logging
+# --------------------------
+log = logging.getLogger("vad")
+if not log.handlers:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+
 def load_audio(path, sr=16000):
     x, _ = librosa.load(path, sr=sr, mono=True)
     peak = np.max(np.abs(x)) + 1e-9
     return (0.95 * x / peak) if peak > 0 else x, sr
 
+def _peak_gain(x: np.ndarray, block: int = 1 << 20) -> float:
+    """Same 0.95/peak normalization as load_audio, computed blockwise so a memmap is never copied whole."""
+    peak = max((float(np.max(np.abs(x[i:i + block]))) for i in range(0, len(x), block)), default=0.0)
+    return 0.95 / (peak + 1e-9)
+
 class RegressionHead(nn.Module):
     r"""Classification head."""
 
@@ -56,41 +100,216 @@ class EmotionModel(Wav2Vec2PreTrainedModel):
     def forward(
             self,
             input_values,
+            attention_mask=None,
     ):
 
-        outputs = self.wav2vec2(input_values)
+        outputs = self.wav2vec2(input_values, attention_mask=attention_mask)
         hidden_states = outputs[0]
-        hidden_states = torch.mean(hidden_states, dim=1)
+        if attention_mask is None:
+            hidden_states = torch.mean(hidden_states, dim=1)
+        else:
+            # mean over real frames only, so padding doesn't dilute the pooled state
+            mask = self._get_feature_vector_attention_mask(hidden_states.shape[1], attention_mask)
+            mask = mask.unsqueeze(-1).to(hidden_states.dtype)
+            hidden_states = (hidden_states * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
         logits = self.classifier(hidden_states)
 
         return hidden_states, logits
 
+# --------------------------
+# Backends: every runner maps numpy (input_values [B, T], attention_mask [B, T] | None)
+# -> numpy (pooled hidden [B, D], logits [B, 3])
+# --------------------------
+class TorchRunner:
+    def __init__(self, model: nn.Module):
+        self.model = model
+
+    def __call__(self, input_values: np.ndarray, attention_mask=None):
+        y = torch.from_numpy(input_values).to(DEVICE)
+        mask = torch.from_numpy(attention_mask).to(DEVICE) if attention_mask is not None else None
+        with torch.no_grad():
+            hidden, logits = self.model(y, attention_mask=mask)
+        return hidden.detach().cpu().numpy(), logits.detach().cpu().numpy()
+
+class OnnxRunner:
+    def __init__(self, path: str):
+        import onnxruntime as ort  # optional dependency; only needed for VAD_COMPUTE=onnx
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(path, opts, providers=["CPUExecutionProvider"])
+
+    def __call__(self, input_values: np.ndarray, attention_mask=None):
+        if attention_mask is None:
+            attention_mask = np.ones(input_values.shape, dtype=np.int64)
+        hidden, logits = self.session.run(
+            ["hidden_states", "logits"],
+            {"input_values": input_values, "attention_mask": attention_mask.astype(np.int64)},
+        )
+        return hidden, logits
+
+def load_model(compute: str = COMPUTE):
+    """Build (processor, runner) for a compute type: float32 | int8 | onnx."""
+    processor = Wav2Vec2Processor.from_pretrained(MODEL_NAME)
+    if compute == "onnx":
+        if not Path(ONNX_PATH).exists():
+            raise RuntimeError(f"ONNX model not found at {ONNX_PATH}; run scripts/export_vad_onnx.py")
+        return processor, OnnxRunner(ONNX_PATH)
+
+    model = EmotionModel.from_pretrained(MODEL_NAME).to(DEVICE)
+    model.eval()
+    if compute == "int8":
+        model = torch.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+    elif compute != "float32":
+        raise ValueError(f"Unknown VAD_COMPUTE '{compute}' (expected float32 | int8 | onnx)")
+    return processor, TorchRunner(model)
+
+# --------------------------
+# Model registry (one processor + model per process)
+# --------------------------
+_PROCESSOR = None
+_MODEL = None
+_MODEL_LOCK = threading.Lock()
+
+def get_model():
+    """Lazy-load the emotion processor and model once; safe to call from many threads."""
+    global _PROCESSOR, _MODEL
+    if _MODEL is None:
+        with _MODEL_LOCK:
+            if _MODEL is None:
+                log.info(f"Loading emotion model '{MODEL_NAME}' on {DEVICE} ({COMPUTE})...")
+                _PROCESSOR, _MODEL = load_model(COMPUTE)
+                log.info("Emotion model loaded.")
+    return _PROCESSOR, _MODEL
+
+def use_model(processor, runner) -> None:
+    """Install an already-built (processor, runner), e.g. to compare backends in one process."""
+    global _PROCESSOR, _MODEL
+    with _MODEL_LOCK:
+        _PROCESSOR, _MODEL = processor, runner
+
+def model_ready() -> bool:
+    return _MODEL is not None
+
+def warmup() -> None:
+    """Load the model and run one short forward pass so the first upload is not cold."""
+    try:
+        get_model()
+        process_func(np.zeros(16000, dtype=np.float32), 16000)
+        log.info("Emotion model warm.")
+    except Exception:
+        log.exception("Emotion model warmup failed; will retry lazily on first request.")
+
+# column order of the regression head's logits
+LABELS = ("arousal", "dominance", "valence")
+
+def _forward_batch(xs: List[np.ndarray], sampling_rate: int):
+    """
+    One forward pass over a batch -> (pooled hidden states [B, D], logits [B, 3]).
+    Equal-length signals are stacked as-is; mixed lengths are zero-padded with an attention mask.
+    """
+    processor, model = get_model()
+    xs = list(xs)
+    if len({len(x) for x in xs}) == 1:
+        # run through processor to normalize each signal, then stack into a batch
+        y = processor(xs, sampling_rate=sampling_rate)
+        y = np.stack(y['input_values']).astype(np.float32, copy=False)
+        mask = None
+    else:
+        y = processor(xs, sampling_rate=sampling_rate, padding=True,
+                      return_attention_mask=True, return_tensors="np")
+        mask = y['attention_mask']
+        y = y['input_values'].astype(np.float32, copy=False)
+
+    # run through model (torch or onnx runner; both return numpy)
+    return model(y, mask)
+
+def _forward(x: np.ndarray, sampling_rate: int):
+    """One forward pass over a single signal -> (pooled hidden states, logits), both [1, D] numpy."""
+    return _forward_batch([x], sampling_rate)
+
+_BATCHER: EmotionBatcher = None
+
+def get_batcher() -> EmotionBatcher:
+    global _BATCHER
+    if _BATCHER is None:
+        with _MODEL_LOCK:
+            if _BATCHER is None:
+                _BATCHER = EmotionBatcher(_forward_batch, max_batch=BATCH_SIZE,
+                                          max_wait_ms=BATCH_WAIT_MS, bucket_s=BUCKET_S)
+    return _BATCHER
+
+def _infer(xs: List[np.ndarray], sampling_rate: int, audio_id=None):
+    """Route through the shared batcher when enabled, else run the batch directly."""
+    if BATCHER:
+        return get_batcher().infer(audio_id, xs, sampling_rate)
+    return _forward_batch(xs, sampling_rate)
+
 def process_func(
     x: np.ndarray,
     sampling_rate: int,
     embeddings: bool = False,
 ) -> np.ndarray:
     r"""Predict emotions or extract embeddings from raw audio signal."""
-    device = 'cpu'
-    model_name = 'audeering/wav2vec2-large-robust-12-ft-emotion-msp-dim'
-    processor = Wav2Vec2Processor.from_pretrained(model_name)
-    model = EmotionModel.from_pretrained(model_name).to(device)
-    # run through processor to normalize signal
-    # always returns a batch, so we just get the first entry
-    # then we put it on the device
-    y = processor(x, sampling_rate=sampling_rate)
-    y = y['input_values'][0]
-    y = y.reshape(1, -1)
-    y = torch.from_numpy(y).to(device)
-
-    # run through model
-    with torch.no_grad():
-        y = model(y)[0 if embeddings else 1]
-
-    # convert to numpy
-    y = y.detach().cpu().numpy()
-
-    return y
+    hidden, logits = _forward(x, sampling_rate)
+    return hidden if embeddings else logits
+
+def predict_vad(x: np.ndarray, sampling_rate: int, embeddings: bool = False, audio_id=None,
+                gain: float = 1.0) -> Dict:
+    """
+    Single forward pass returning all three dimensions:
+      {"valence": .., "arousal": .., "dominance": .., ["embedding": np.ndarray[D]]}
+    """
+    hidden, logits = _infer([x * gain if gain != 1.0 else x], sampling_rate, audio_id)
+    out = {name: float(logits[0][i]) for i, name in enumerate(LABELS)}
+    if embeddings:
+        out["embedding"] = hidden[0]
+    return out
+
+def _window_starts(n_samples: int, win: int, hop: int) -> List[int]:
+    """Start offsets of fixed-length windows; the last one is end-aligned so all windows share a length."""
+    if n_samples <= win:
+        return [0]
+    starts = list(range(0, n_samples - win + 1, hop))
+    if starts[-1] + win < n_samples:
+        starts.append(n_samples - win)
+    return starts
+
+def predict_vad_windowed(x: np.ndarray, sampling_rate: int, embeddings: bool = False, audio_id=None,
+                         gain: float = 1.0) -> Dict:
+    """
+    Run the model over overlapping WINDOW_S windows (HOP_S apart), BATCH_SIZE at a time
+    (batched together with other uploads' windows when VAD_BATCHER=1).
+    Peak memory depends on the window, not on the recording length; `gain` is applied per window
+    so a memory-mapped signal is only ever copied one batch at a time.
+    Returns the aggregate (window mean) plus the per-window curves:
+      {"valence": .., "arousal": .., "dominance": ..,
+       "windows": {"t_ms": [...], "valence": [...], "arousal": [...], "dominance": [...]},
+       ["embedding": np.ndarray[D]]}
+    """
+    win = int(WINDOW_S * sampling_rate)
+    hop = max(1, int(HOP_S * sampling_rate))
+    starts = _window_starts(len(x), win, hop)
+
+    curves = {name: [] for name in LABELS}
+    centers: List[int] = []
+    emb_sum = None
+    for i in range(0, len(starts), BATCH_SIZE):
+        batch = starts[i:i + BATCH_SIZE]
+        chunks = [x[s:s + win] * gain if gain != 1.0 else x[s:s + win] for s in batch]
+        hidden, logits = _infer(chunks, sampling_rate, audio_id)
+        for j, s in enumerate(batch):
+            for k, name in enumerate(LABELS):
+                curves[name].append(float(logits[j][k]))
+            centers.append(int((s + len(chunks[j]) / 2) / sampling_rate * 1000))
+        if embeddings:
+            part = hidden.sum(axis=0)
+            emb_sum = part if emb_sum is None else emb_sum + part
+
+    out = {name: float(np.mean(curves[name])) for name in LABELS}
+    out["windows"] = {"t_ms": centers, **curves}
+    if embeddings:
+        out["embedding"] = emb_sum / len(starts)
+    return out
 
 def _guess_recorded_date(audio_path: str) -> str:
     """
@@ -104,28 +323,75 @@ def _guess_recorded_date(audio_path: str) -> str:
         local_dt = datetime.now().astimezone()
     return local_dt.date().isoformat()
 
-def compute_vad_from_wav(audio_path: str, fps: int = 25) -> Dict:
-
-    y, sr = load_audio(audio_path)
-    dur_ms = int(len(y) / sr * 1000) if len(y) else 0
+def compute_vad_from_wav(audio_path: str, fps: int = 25, audio_id=None, speech_path: str = None,
+                         embeddings: bool = False) -> Dict:
+    """
+    audio_path: decoded PCM (.npy from audio_utils.ensure_pcm, memory-mapped) or any librosa-readable file.
+    speech_path: optional speech regions (speech.ensure_speech_regions); with VAD_SPEECH_ONLY=1
+    the model only sees speech, and the result records how much audio was skipped.
+    embeddings: also return the pooled embedding under "embedding" (numpy; pop it before saving JSON).
+    """
+    if audio_path.endswith(".npy"):
+        signal, sr = audio_utils.load_pcm(audio_path), audio_utils.SAMPLE_RATE
+        gain = _peak_gain(signal)
+    else:
+        signal, sr = load_audio(audio_path, sr=16000)
+        gain = 1.0
+    dur_ms = int(len(signal) / sr * 1000) if len(signal) else 0
     n = max(1, int((dur_ms/1000) * fps))
     t_ms = np.linspace(0, dur_ms, n, dtype=int)
 
-    signal, sr = load_audio(audio_path, sr=16000)
-    a = process_func(signal, sr)[0][0]
-    d = process_func(signal, sr)[0][1]
-    v = process_func(signal, sr)[0][2]
-    
-    return {
+    speech = None
+    if SPEECH_ONLY and speech_path:
+        regions = speech_service.load_speech_json(speech_path)["regions"]
+        view = speech_service.SpeechSignal(signal, regions)
+        if len(view):   # no detected speech -> fall back to the whole recording
+            speech = view
+    x = speech if speech is not None else signal
+
+    if WINDOWED:
+        pred = predict_vad_windowed(x, sr, embeddings=embeddings, audio_id=audio_id, gain=gain)
+    else:
+        pred = predict_vad(x[:] if speech is not None else x, sr, embeddings=embeddings,
+                           audio_id=audio_id, gain=gain)
+
+    out = {
         "duration": float(dur_ms),
         "vad": {
-            "valence": float(v),
-            "arousal": float(a),
-            "dominance": float(d),
+            "valence": pred["valence"],
+            "arousal": pred["arousal"],
+            "dominance": pred["dominance"],
         },
         "recorded_date": _guess_recorded_date(audio_path),
     }
 
+    speech_ms = int(len(x) / sr * 1000)
+    out["speech"] = {
+        "gated": speech is not None,
+        "regions": len(speech.regions) if speech is not None else None,
+        "speech_ms": speech_ms,
+        "skipped_ms": dur_ms - speech_ms,
+        "skipped_ratio": round((dur_ms - speech_ms) / dur_ms, 3) if dur_ms else 0.0,
+    }
+
+    win = pred.get("windows")
+    if win:
+        if speech is not None:
+            # window centres are on the speech-only timeline; put them back on the recording's
+            win["t_ms"] = speech.source_ms(win["t_ms"], sr)
+        out["windows"] = {
+            "window_ms": int(WINDOW_S * 1000),
+            "hop_ms": int(HOP_S * 1000),
+            "t_ms": win["t_ms"],
+            **{name: np.round(win[name], 3).tolist() for name in LABELS},
+        }
+        # per-frame arousal on the fps grid, for the frontend sparkline
+        out["frame_hz"] = fps
+        out["frames"] = np.round(np.interp(t_ms, win["t_ms"], win["arousal"]), 3).tolist()
+    if embeddings:
+        out["embedding"] = pred["embedding"]
+    return out
+
 
 
 # def compute_vad_from_wav(filepath: str) -> Dict:
@@ -0,0 +1,100 @@
+# backend/app/services/vad_batch.py
+# Cross-request batching in front of the emotion model:
+# - callers submit signals (whole recordings or windows) tagged with their audio_id
+# - one background thread waits up to max_wait_ms for more work, buckets by length,
+#   and runs each bucket as a single padded forward pass
+# - every signal gets its own Future with (pooled hidden [D], logits [3])
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+log = logging.getLogger("vad")
+
+Runner = Callable[[List[np.ndarray], int], Tuple[np.ndarray, np.ndarray]]
+
+class _Item:
+    __slots__ = ("audio_id", "signal", "sampling_rate", "future")
+
+    def __init__(self, audio_id, signal, sampling_rate):
+        self.audio_id = audio_id
+        self.signal = signal
+        self.sampling_rate = sampling_rate
+        self.future: Future = Future()
+
+class EmotionBatcher:
+    def __init__(self, runner: Runner, max_batch: int = 4, max_wait_ms: int = 20, bucket_s: float = 1.0):
+        self.runner = runner
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000.0
+        self.bucket_s = bucket_s
+        self._queue: "queue.Queue[_Item]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _ensure_thread(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="vad-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, audio_id, signals: List[np.ndarray], sampling_rate: int) -> List[Future]:
+        self._ensure_thread()
+        items = [_Item(audio_id, x, sampling_rate) for x in signals]
+        for it in items:
+            self._queue.put(it)
+        return [it.future for it in items]
+
+    def infer(self, audio_id, signals: List[np.ndarray], sampling_rate: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Blocking helper: submit and gather -> (hidden [N, D], logits [N, 3]) in input order."""
+        results = [f.result() for f in self.submit(audio_id, signals, sampling_rate)]
+        return np.stack([h for h, _ in results]), np.stack([l for _, l in results])
+
+    def _collect(self) -> List[_Item]:
+        items = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                items.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        # anything else already waiting rides along without extending the wait
+        while True:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                return items
+
+    def _buckets(self, items: List[_Item]) -> List[List[_Item]]:
+        groups: Dict[tuple, List[_Item]] = {}
+        for it in items:
+            width = max(1, int(self.bucket_s * it.sampling_rate))
+            groups.setdefault((it.sampling_rate, len(it.signal) // width), []).append(it)
+        batches = []
+        for key in sorted(groups):
+            group = groups[key]
+            for i in range(0, len(group), self.max_batch):
+                batches.append(group[i:i + self.max_batch])
+        return batches
+
+    def _loop(self) -> None:
+        while True:
+            items = self._collect()
+            for batch in self._buckets(items):
+                try:
+                    hidden, logits = self.runner([it.signal for it in batch], batch[0].sampling_rate)
+                except Exception as e:
+                    for it in batch:
+                        it.future.set_exception(e)
+                    continue
+                log.debug(f"VAD batch of {len(batch)} for audio {sorted({str(it.audio_id) for it in batch})}")
+                for j, it in enumerate(batch):
+                    it.future.set_result((hidden[j], logits[j]))
@@ -0,0 +1,127 @@
+# backend/app/worker.py
+# Pipeline worker: leases jobs from the SQLite queue and runs the stage functions.
+#   cd backend && python -m app.worker
+# Run as many as the hardware allows; they coordinate through the job table. With
+# JOBS_INPROCESS=1 the API starts one of these in a background thread instead.
+#
+# Two lanes: model stages (pipeline.CPU_STAGES) hand their inference to the pre-warmed
+# process pool in services/inference.py; LLM stages are I/O-bound and run on plain threads.
+
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Iterable, Optional
+
+from sqlmodel import Session
+
+from app.core.db import engine, init_db
+from app.models.db import Job
+from app.services import inference
+from app.services import jobs
+from app.services import pipeline
+
+CPU_SLOTS = int(os.getenv("WORKER_CPU_SLOTS", "2"))        # model stages in flight (see also INFER_PROCS)
+IO_SLOTS  = int(os.getenv("WORKER_IO_SLOTS", "4"))         # LLM stages in flight
+POLL_S    = float(os.getenv("WORKER_POLL_S", "0.5"))      # idle sleep between queue checks
+PRUNE_S   = float(os.getenv("WORKER_PRUNE_S", "600"))     # how often finished jobs are pruned
+
+log = jobs.log
+
+
+class Worker:
+    def __init__(self, cpu_slots: int = CPU_SLOTS, io_slots: int = IO_SLOTS):
+        self.cpu_slots = cpu_slots
+        self.io_slots = io_slots
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._stop = threading.Event()
+        self._threads = []
+
+    def _heartbeat(self, job_id: int, done: threading.Event) -> None:
+        while not done.wait(jobs.HEARTBEAT_S):
+            with Session(engine) as s:
+                if not jobs.heartbeat(s, job_id, self.worker_id):
+                    log.warning(f"Lost the lease on job {job_id}")
+                    return
+
+    def run_one(self, stages: Optional[Iterable[str]] = None) -> bool:
+        """Claim and run a single job; False if the queue had nothing runnable."""
+        with Session(engine) as s:
+            job = jobs.claim(s, self.worker_id, stages)
+            if not job:
+                return False
+            job_id, stage, audio_id, refresh = job.id, job.stage, job.audio_id, job.refresh
+        done = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(job_id, done), daemon=True).start()
+        t0 = time.perf_counter()
+        try:
+            pipeline.run_stage(stage, audio_id, refresh)
+        except Exception as e:
+            with Session(engine) as s:
+                jobs.fail(s, s.get(Job, job_id), e)
+            return True
+        finally:
+            done.set()
+        with Session(engine) as s:
+            # completion and the dependents it unblocks commit together
+            jobs.complete(s, s.get(Job, job_id))
+            pipeline.schedule(s, audio_id, stage)
+            s.commit()
+        log.info(f"Job {job_id} ({stage}, audio {audio_id}) done in {time.perf_counter() - t0:.2f}s")
+        return True
+
+    def _loop(self, stages: Iterable[str]) -> None:
+        stages = tuple(stages)
+        while not self._stop.is_set():
+            try:
+                if not self.run_one(stages):
+                    self._stop.wait(POLL_S)
+            except Exception:
+                log.exception("Worker loop error")
+                self._stop.wait(POLL_S)
+
+    def _prune_loop(self) -> None:
+        while not self._stop.wait(PRUNE_S):
+            try:
+                with Session(engine) as s:
+                    n = jobs.prune(s)
+                if n:
+                    log.info(f"Pruned {n} finished jobs")
+            except Exception:
+                log.exception("Job pruning failed")
+
+    def start(self, prewarm: bool = True) -> "Worker":
+        if prewarm and self.cpu_slots:
+            # load models in the pool processes now; model jobs simply wait on the pool meanwhile
+            threading.Thread(target=inference.prewarm, name="inference-warmup", daemon=True).start()
+        lanes = [("cpu", pipeline.CPU_STAGES, self.cpu_slots),
+                 ("io", set(pipeline.STAGES) - pipeline.CPU_STAGES, self.io_slots)]
+        for lane, stages, slots in lanes:
+            for i in range(slots):
+                t = threading.Thread(target=self._loop, args=(stages,), name=f"worker-{lane}-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+        threading.Thread(target=self._prune_loop, name="worker-prune", daemon=True).start()
+        log.info(f"Worker {self.worker_id} started ({self.cpu_slots} cpu / {self.io_slots} io slots)")
+        return self
+
+    def stop(self, timeout: float = None) -> None:
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout)
+        inference.shutdown()
+
+
+def main():
+    init_db()
+    w = Worker().start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        w.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+# backend/scripts/bench_transcribe.py
+# Benchmark the transcription stage and check it decodes each file exactly once:
+# counts calls to WhisperModel.transcribe and BatchedInferencePipeline.transcribe,
+# then verifies that segments and words are populated whenever there is transcript text.
+#
+#   cd backend && python scripts/bench_transcribe.py [audio ...]
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from app.services import transcribe as tx_service  # noqa: E402
+
+DEFAULT_AUDIO = ["data/audio/20_low_v_high_a.mp3"]
+
+CALLS = {"n": 0}
+
+def counting(fn):
+    def wrapper(*args, **kwargs):
+        CALLS["n"] += 1
+        return fn(*args, **kwargs)
+    return wrapper
+
+def main(paths) -> int:
+    tx_service.WhisperModel.transcribe = counting(tx_service.WhisperModel.transcribe)
+    tx_service.BatchedInferencePipeline.transcribe = counting(tx_service.BatchedInferencePipeline.transcribe)
+
+    failed = 0
+    for path in paths:
+        before = CALLS["n"]
+        t0 = time.perf_counter()
+        tx = tx_service.transcribe(path)
+        elapsed = time.perf_counter() - t0
+        calls = CALLS["n"] - before
+        ok = calls == 1 and (not tx["transcript"] or (tx["segments"] and tx["words"]))
+        dur = tx.get("duration") or 0
+        print(
+            f"{'OK  ' if ok else 'FAIL'} {path}: model calls={calls} segments={len(tx['segments'])} "
+            f"words={len(tx['words'])} elapsed={elapsed:.2f}s rtf={elapsed / dur if dur else float('nan'):.3f}"
+        )
+        failed += not ok
+    print(f"pool: {tx_service.pool_stats()}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:] or DEFAULT_AUDIO))
@@ -0,0 +1,40 @@
+# backend/scripts/check_vad_single_pass.py
+# Regression check: predict_vad (one forward pass) must match the old
+# three-call process_func output column for column.
+#
+#   cd backend && python scripts/check_vad_single_pass.py [audio ...]
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from app.services import vad as vad_service  # noqa: E402
+
+DEFAULT_AUDIO = ["data/audio/20_low_v_high_a.mp3"]
+
+def legacy_three_call(signal: np.ndarray, sr: int) -> dict:
+    return {
+        "arousal": float(vad_service.process_func(signal, sr)[0][0]),
+        "dominance": float(vad_service.process_func(signal, sr)[0][1]),
+        "valence": float(vad_service.process_func(signal, sr)[0][2]),
+    }
+
+def main(paths) -> int:
+    failed = 0
+    for path in paths:
+        signal, sr = vad_service.load_audio(path, sr=16000)
+        old = legacy_three_call(signal, sr)
+        new = vad_service.predict_vad(signal, sr, embeddings=True)
+        emb = vad_service.process_func(signal, sr, embeddings=True)[0]
+        ok = all(np.isclose(old[k], new[k], rtol=0, atol=1e-6) for k in vad_service.LABELS)
+        ok = ok and np.allclose(emb, new["embedding"], rtol=0, atol=1e-6)
+        print(f"{'OK  ' if ok else 'FAIL'} {path}")
+        for k in vad_service.LABELS:
+            print(f"    {k:<9} three-call={old[k]:.6f} single-pass={new[k]:.6f}")
+        failed += not ok
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:] or DEFAULT_AUDIO))
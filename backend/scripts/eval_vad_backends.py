@@ -0,0 +1,60 @@
+# backend/scripts/eval_vad_backends.py
+# Compare VAD_COMPUTE backends against float32 on sample audio:
+# per-dimension absolute error and real-time factor (processing seconds / audio seconds).
+#
+#   cd backend && python scripts/eval_vad_backends.py [--compute float32 int8 onnx] [audio ...]
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from app.services import vad as vad_service  # noqa: E402
+
+DEFAULT_AUDIO = ["data/audio/20_low_v_high_a.mp3"]
+
+def run(signals, sr):
+    out = []
+    t0 = time.perf_counter()
+    for x in signals:
+        if vad_service.WINDOWED:
+            out.append(vad_service.predict_vad_windowed(x, sr))
+        else:
+            out.append(vad_service.predict_vad(x, sr))
+    return out, time.perf_counter() - t0
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--compute", nargs="+", default=["float32", "int8", "onnx"])
+    ap.add_argument("audio", nargs="*", default=DEFAULT_AUDIO)
+    args = ap.parse_args()
+
+    vad_service.BATCHER = False   # measure the backend itself, not the batching wait
+    signals = [vad_service.load_audio(p, sr=16000)[0] for p in args.audio]
+    audio_s = sum(len(x) for x in signals) / 16000
+
+    computes = ["float32"] + [c for c in args.compute if c != "float32"]
+    baseline = None
+    for compute in computes:
+        try:
+            vad_service.use_model(*vad_service.load_model(compute))
+        except Exception as e:
+            print(f"{compute:<8} skipped: {e}")
+            continue
+        run(signals[:1], 16000)   # warm up
+        preds, elapsed = run(signals, 16000)
+        if baseline is None:
+            baseline = preds
+        err = {
+            k: max(abs(p[k] - b[k]) for p, b in zip(preds, baseline))
+            for k in vad_service.LABELS
+        }
+        print(
+            f"{compute:<8} rtf={elapsed / audio_s:.3f}  "
+            + "  ".join(f"max|d{k}|={err[k]:.4f}" for k in vad_service.LABELS)
+        )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+# backend/scripts/export_vad_onnx.py
+# Export the wav2vec2 emotion regressor to ONNX for VAD_COMPUTE=onnx.
+#
+#   cd backend && python scripts/export_vad_onnx.py [--out data/models/vad_emotion.onnx] [--int8]
+#
+# --int8 additionally runs onnxruntime dynamic quantization on the exported graph
+# (writes <out>.int8.onnx; point VAD_ONNX_PATH at it to use it).
+
+import argparse
+import sys
+from pathlib import Path
+
+import torch
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from app.services import vad as vad_service  # noqa: E402
+
+class _Export(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_values, attention_mask):
+        return self.model(input_values, attention_mask=attention_mask)
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--out", default=vad_service.ONNX_PATH)
+    ap.add_argument("--opset", type=int, default=17)
+    ap.add_argument("--int8", action="store_true")
+    args = ap.parse_args()
+
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+
+    model = vad_service.EmotionModel.from_pretrained(vad_service.MODEL_NAME).eval()
+    dummy = torch.zeros(1, 16000 * 4)
+    mask = torch.ones(1, 16000 * 4, dtype=torch.int64)
+    torch.onnx.export(
+        _Export(model), (dummy, mask), str(out),
+        input_names=["input_values", "attention_mask"],
+        output_names=["hidden_states", "logits"],
+        dynamic_axes={
+            "input_values": {0: "batch", 1: "samples"},
+            "attention_mask": {0: "batch", 1: "samples"},
+            "hidden_states": {0: "batch"},
+            "logits": {0: "batch"},
+        },
+        opset_version=args.opset,
+    )
+    print(f"wrote {out}")
+
+    if args.int8:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        q_out = out.with_suffix(".int8.onnx")
+        quantize_dynamic(str(out), str(q_out), weight_type=QuantType.QInt8)
+        print(f"wrote {q_out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+# backend/scripts/retranscribe_backlog.py
+# Queue a backlog of stored uploads for transcription again, through the job queue, so the
+# work runs on the workers' inference pool next to live traffic instead of competing with it
+# for the CPU. Entries with a transcript get a `refine` job (full-quality pass, written in place
+# with its version and dedup artifact); entries without one, or --status failed entries, are
+# put back to "processing" and rescheduled, which queues transcription and everything after it.
+#
+# Files are decoded on as many CPU slots as the workers run; within a file, long inputs use the
+# batched pipeline when the workers run with STT_BATCHED=1 (faster-whisper only batches chunks
+# of one file, there is no cross-file batch).
+#
+#   cd backend && python scripts/retranscribe_backlog.py [--status failed] [--wait] [id ...]
+
+import argparse
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from sqlalchemy import update  # noqa: E402
+from sqlmodel import Session, select  # noqa: E402
+
+from app.core.db import engine, init_db  # noqa: E402
+from app.models.db import Audio, Job, Transcript  # noqa: E402
+from app.services import jobs, pipeline  # noqa: E402
+from app.services import transcribe as tx_service  # noqa: E402
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("ids", nargs="*", type=int)
+    ap.add_argument("--status", help="only rows with this Audio.status (e.g. failed)")
+    ap.add_argument("--wait", action="store_true", help="wait for the queued jobs and report throughput")
+    args = ap.parse_args()
+
+    init_db()
+    t0, since = time.perf_counter(), datetime.utcnow()
+    with Session(engine) as s:
+        q = select(Audio)
+        if args.ids:
+            q = q.where(Audio.id.in_(args.ids))
+        if args.status:
+            q = q.where(Audio.status == args.status)
+        rows = s.exec(q.order_by(Audio.id)).all()
+
+        ids = []
+        for a in rows:
+            t = s.exec(select(Transcript).where(Transcript.audio_id == a.id)).first()
+            if a.status == "failed":
+                a.status = "processing"
+                s.add(a)
+            if t and a.transcript_ready:
+                # mark the stored transcript as needing the full-quality pass again
+                t.version = min(t.version, tx_service.TIERS["draft"]["version"])
+                s.add(t)
+                jobs.enqueue(s, a.id, "refine")
+            s.flush()
+            pipeline.schedule(s, a.id)   # whatever else is missing (transcribe, summary, ...)
+            # backlog work queues behind interactive uploads (see jobs.FAIR_BULK_AGE_S)
+            s.exec(update(Job).where(Job.audio_id == a.id, Job.status == "queued")
+                   .values(priority=jobs.PRIORITIES["bulk"]))
+            ids.append(a.id)
+            print(f"QUEUED {a.id}")
+        s.commit()
+
+    if not args.wait or not ids:
+        return 0
+    while True:
+        with Session(engine) as s:
+            pending = s.exec(select(Job.id).where(Job.audio_id.in_(ids), Job.stage.in_(("transcribe", "refine")),
+                                                  Job.status.in_(("queued", "running")))).all()
+        if not pending:
+            break
+        time.sleep(2)
+    elapsed = time.perf_counter() - t0
+    with Session(engine) as s:
+        audio_s = sum(a.duration_s or 0 for a in s.exec(select(Audio).where(Audio.id.in_(ids))))
+        failed = s.exec(select(Job.audio_id).where(Job.audio_id.in_(ids), Job.status == "failed",
+                                                   Job.stage.in_(("transcribe", "refine")),
+                                                   Job.created_at >= since)).all()
+    for audio_id in sorted(set(failed)):
+        print(f"FAIL {audio_id}")
+    print(f"{len(ids)} files, {audio_s / 3600:.2f} audio-hours, {audio_s / elapsed:.1f}x real time")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())